@@ -14,21 +14,17 @@
 #   You should have received a copy of the GNU General Public License
 #   along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
-try:
-    import cairocffi
-
-    cairocffi.install_as_pycairo()
-except ImportError:
-    pass
-import cairo
 import math
+import os
+import io
 import sys
 import argparse
 from argparse import ArgumentParser
 import re
+import time
 from functools import wraps
 from xml.sax.saxutils import quoteattr
-from contextlib import contextmanager
+from contextlib import contextmanager, nullcontext
 import copy
 
 try:  # py3
@@ -36,12 +32,23 @@ try:  # py3
 except ImportError:  # py2
     from pipes import quote
 
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
 from boxes import edges
+from boxes import drawing
 from boxes import formats
+from boxes import nesting
+from boxes import commonline
+from boxes import toolpath
 from boxes import svgutil
 from boxes import gears
 from boxes import pulley
 from boxes import parts
+from boxes import profiling
+from boxes.estimate import Machine
 from boxes.Color  import *
 
 ### Helpers
@@ -247,6 +254,8 @@ class Boxes:
         self.argparser = ArgumentParser(description=description)
         self.edgesettings = {}
         self.inkscapefile = None
+        # profiling.Profile measuring the rendering - None to not measure
+        self.renderProfile = None
 
         self.metadata = {
             "name" : self.__class__.__name__,
@@ -281,12 +290,37 @@ class Boxes:
         defaultgroup.add_argument(
             "--burn", action="store", type=float, default=0.1,
             help='burn correction in mm (bigger values for tighter fit). Use BurnTest in "Parts and Samples" to find the right value.')
+        defaultgroup.add_argument(
+            "--sheet", action="store", type=str, default="",
+            help="size of the material as WIDTHxHEIGHT in mm to arrange the parts on. Creates one file per sheet if needed (empty for no arrangement)")
+        defaultgroup.add_argument(
+            "--rotate", action="store", type=boolarg, default=True,
+            help="allow turning parts by 90° when arranging them on sheets")
+        defaultgroup.add_argument(
+            "--commonline", action="store", type=boolarg, default=False,
+            help="place parts with only the kerf between them and cut shared straight edges only once")
+        defaultgroup.add_argument(
+            "--flatten", action="store", type=boolarg, default=False,
+            help="write repeated parts out in full instead of referencing a single copy (SVG <use>)")
+        machinegroup = self.argparser.add_argument_group(
+                        "Machine Settings")
+        # only shown in the web interface if one of these is selected
+        machinegroup.formats = ("gcode", "plt")
+        machinegroup.add_argument(
+            "--feed", action="store", type=float, default=1000.0,
+            help="cutting speed in mm/min (gcode and plt only)")
+        machinegroup.add_argument(
+            "--power", action="store", type=float, default=100.0,
+            help="laser/spindle power in percent (gcode only)")
+        machinegroup.add_argument(
+            "--passes", action="store", type=int, default=1,
+            help="number of times each path is cut (gcode and plt only)")
 
     @contextmanager
     def saved_context(self):
         """
-        Generator: for saving and restoring cairo contexts.
-        :param cr: cairo context
+        Generator: for saving and restoring contexts.
+        :param cr: drawing context
         """
         cr = self.ctx
         cr.save()
@@ -301,6 +335,12 @@ class Boxes:
         """
         self.ctx.set_source_rgb(*color)
 
+    def _phase(self, name):
+        """Context manager timing phase name if .renderProfile is set"""
+        if self.renderProfile is None:
+            return nullcontext()
+        return self.renderProfile.phase(name)
+
     def open(self):
         """
         Prepare for rendering
@@ -311,9 +351,16 @@ class Boxes:
         if self.ctx is not None:
             return
 
+        with self._phase("open"):
+            self._open()
+        if self.renderProfile is not None:
+            self.renderProfile.attach(self)
+            self._renderStart = time.perf_counter()
+
+    def _open(self):
         self.bedBoltSettings = (3, 5.5, 2, 20, 15)  # d, d_nut, h_nut, l, l1
         self.hexHolesSettings = (5, 3, 'circle')  # r, dist, style
-        self.surface, self.ctx = self.formats.getSurface(self.format, self.output)
+        self.surface, self.ctx = self.formats.getSurface(self.format)
 
         if self.format == 'svg_Ponoko':
             self.ctx.set_line_width(0.01)
@@ -322,9 +369,14 @@ class Boxes:
             self.ctx.set_line_width(max(2 * self.burn, 0.05))
             self.set_source_color(Color.BLACK)
 
-        self.spacing = 2 * self.burn + 0.5 * self.thickness
+        if getattr(self, "commonline", False):
+            # outlines of neighboring parts coincide
+            self.spacing = 2 * self.burn
+        else:
+            self.spacing = 2 * self.burn + 0.5 * self.thickness
         self.ctx.select_font_face("sans-serif")
-        self._buildObjects()
+        with self._phase("buildObjects"):
+            self._buildObjects()
         if self.reference and self.format != 'svg_Ponoko':
             self.move(10, 10, "up", before=True)
             self.ctx.rectangle(0, 0, self.reference, 10)
@@ -435,6 +487,10 @@ class Boxes:
         """
         if args is None:
             args = sys.argv[1:]
+        with self._phase("argparse"):
+            self._parseArgs(args)
+
+    def _parseArgs(self, args):
         if len(args) > 1 and args[-1][0] != "-":
             self.inkscapefile = args[-1]
             del args[-1]
@@ -611,17 +667,151 @@ class Boxes:
     def close(self):
         """Finish rendering
 
-        Flush canvas to disk and convert output to requested format if needed.
+        Write the recorded drawing to disk and convert output to
+        requested format if needed. .output may also be a binary file
+        object (e.g. io.BytesIO) if .formats.inMemory(.format).
         Call after .render()"""
         if self.ctx == None:
             return
 
+        if self.renderProfile is not None:
+            start = getattr(self, "_renderStart", None)
+            if start is not None:
+                self.renderProfile.add("render", time.perf_counter() - start)
+        with self._phase("close"):
+            self._close()
+        if self.renderProfile is not None:
+            self.renderProfile.finish()
+
+    def dryRun(self, skip_colors=((1.0, 1.0, 1.0),),
+               tolerance=Machine.tolerance):
+        """Render without writing any output and return the geometry
+
+        Use instead of .open(), .render() and .close() if only the
+        sizes are needed. The parts are arranged on sheets and common
+        lines are merged as for writing (see --sheet, --commonline).
+        Returns a dict with
+
+        * "sheets" -- "width", "height" and "cutlength" of each output file
+        * "parts" -- "sheet" (index in "sheets"), "x", "y", "width",
+          "height" and "cutlength" of each part. x and y are relative to
+          the lower left corner of the sheet's drawing.
+        * "width", "height" -- of the largest sheet
+        * "cutlength" -- of all sheets
+
+        Cut lengths are in mm without paths in skip_colors and measured
+        with drawing.Path.length() as in .estimate(). All values are
+        rounded to 0.001mm.
+
+        :param skip_colors: (Default value = ((1.0, 1.0, 1.0),)) colors that are not cut (white)
+        :param tolerance: (Default value = Machine.tolerance) maximal deviation of flattened curves in mm
+        """
+        self._record()
+        sheets = []
+        parts = []
+        for nr, surface in enumerate(self._surfaces()):
+            lengths = [0.0 if tuple(path.color) in skip_colors
+                       else path.length(tolerance) for path in surface.paths]
+            ox, oy = ((surface.extend.minx, surface.extend.miny)
+                      if surface.extend else (0.0, 0.0))
+            for part in surface.parts:
+                extend = surface.partExtend(part)
+                parts.append({
+                    "sheet" : nr,
+                    "x" : round(extend.minx - ox, 3) if extend else 0.0,
+                    "y" : round(extend.miny - oy, 3) if extend else 0.0,
+                    "width" : round(extend.width, 3),
+                    "height" : round(extend.height, 3),
+                    "cutlength" : round(sum(lengths[part[0]:part[1]]), 3)})
+            sheets.append({"width" : round(surface.extend.width, 3),
+                           "height" : round(surface.extend.height, 3),
+                           "cutlength" : round(sum(lengths), 3)})
+        return {"width" : max((s["width"] for s in sheets), default=0.0),
+                "height" : max((s["height"] for s in sheets), default=0.0),
+                "cutlength" : round(sum(s["cutlength"] for s in sheets), 3),
+                "sheets" : sheets,
+                "parts" : parts}
+
+    def estimate(self, **machine):
+        """Render without writing any output and estimate the cut length
+        and machine time of the drawing as it gets written (see
+        ._surfaces()). See boxes.estimate.Machine for the settings and
+        the result. feed and passes default to the arguments of the
+        generator. Lengths and times are rounded to 0.001.
+
+        :param \*\*machine: settings of the Machine (e.g. acceleration, rapid, pierce)
+        """
+        for name in ("feed", "passes"):
+            if machine.get(name) is None:
+                machine[name] = getattr(self, name, None)
+        machine = Machine(**machine)
+        self._record()
+        result = machine.estimate(self._surfaces())
+        return {name : round(value, 3) if isinstance(value, float) else value
+                for name, value in result.items()}
+
+    def _record(self):
+        """Render into .surface without writing - for .dryRun() and .estimate()"""
+        self.open()
+        with self._phase("render"):
+            self.render()
         self.ctx.stroke()
         self.ctx = None
-        self.surface.flush()
-        self.surface.finish()
-
-        self.formats.convert(self.output, self.format, self.metadata)
+        if self.renderProfile is not None:
+            self.renderProfile.finish()
+
+    def _surfaces(self):
+        """Return the recorded drawing as it gets written: arranged on
+        sheets if .sheet is set (one Surface each) and with common lines
+        merged if .commonline is set"""
+        surfaces = [self.surface]
+        if getattr(self, "sheet", None):
+            m = re.match(r"^\s*(\d+(\.\d*)?)\s*[xX*]\s*(\d+(\.\d*)?)\s*$",
+                         self.sheet)
+            if not m:
+                raise ValueError("Sheet size must be given as WIDTHxHEIGHT: %r" %
+                                 self.sheet)
+            spacing = self.spacing
+            if getattr(self, "commonline", False):
+                # the outlines already include the burn - let them touch
+                spacing = 0.0
+            with self._phase("nest"):
+                surfaces = nesting.nest(self.surface, float(m.group(1)),
+                                        float(m.group(3)), spacing,
+                                        getattr(self, "rotate", True))
+        if getattr(self, "commonline", False):
+            with self._phase("commonline"):
+                for surface in surfaces:
+                    commonline.mergeLines(surface)
+        return surfaces
+
+    def _close(self):
+        self.ctx.stroke()
+        self.ctx = None
+        if self.renderProfile is not None:
+            self.renderProfile.count("paths", len(self.surface.paths))
+            self.renderProfile.count("texts", len(self.surface.texts))
+
+        surfaces = self._surfaces()
+        self.outputs = [self.output]
+        if len(surfaces) > 1:
+            if hasattr(self.output, "write"):
+                self.outputs = [io.BytesIO() for s in surfaces]
+            else:
+                base, ext = os.path.splitext(self.output)
+                self.outputs = ["%s_%i%s" % (base, i, ext)
+                                for i in range(1, len(surfaces) + 1)]
+
+        for surface, output in zip(surfaces, self.outputs):
+            with self._phase("write"):
+                self.formats.render(
+                    surface, self.format, output, self.metadata,
+                    feed=getattr(self, "feed", None),
+                    power=getattr(self, "power", None),
+                    passes=getattr(self, "passes", None),
+                    flatten=getattr(self, "flatten", False) or None)
+            with self._phase("convert"):
+                self.formats.convert(output, self.format, self.metadata)
         if self.inkscapefile:
             try:
                 out = sys.stdout.buffer
@@ -1052,6 +1242,7 @@ class Boxes:
 
         if not before:
             self.ctx.stroke()
+            self.surface.endPart()
             # restore position
             self.ctx.restore()
 
@@ -1065,6 +1256,9 @@ class Boxes:
                 self.moveTo(mx, my)
         if not dontdraw:
             if before:
+                # keep what was drawn so far out of the part
+                self.ctx.stroke()
+                self.surface.beginPart()
                 # save position
                 self.ctx.save()
                 if self.debug:
@@ -1312,26 +1506,59 @@ class Boxes:
 
     # hexHoles
 
-    def hexHolesRectangle(self, x, y, settings=None, skip=None):
-        """Fills a rectangle with holes in a hex pattern.
+    @restore
+    @holeCol
+    def holeField(self, positions, r, style="circle"):
+        """
+        Draw many holes of the same size and shape as one path
 
-        Settings have:
-        r : radius of holes
-        b : space between holes
-        style : what types of holes (not yet implemented)
+        Much faster than calling hole() for each of them.
+
+        :param positions: list of (x, y) centers
+        :param r: radius of the holes (half the width for hex and square)
+        :param style:  (Default value = "circle") "circle", "hex" or "square"
+
+        """
+        if r < self.burn:
+            r = self.burn + 1E-9
+        r_ = r - self.burn
+        if style == "circle":
+            for px, py in positions:
+                self.ctx.move_to(px + r_, py)
+                self.ctx.arc_negative(px, py, r_, 0, -2 * math.pi)
+            return
+        if style == "hex":
+            # flat sides facing the neighbours in the hex pattern
+            rc = r_ / math.cos(math.pi / 6)
+            corners = [(rc * math.cos(math.radians(a)),
+                        rc * math.sin(math.radians(a)))
+                       for a in range(30, -330, -60)]
+        elif style == "square":
+            corners = [(r_, r_), (r_, -r_), (-r_, -r_), (-r_, r_)]
+        else:
+            raise ValueError("Unknown hole style: %r" % (style,))
+        for px, py in positions:
+            self.ctx.move_to(px + corners[0][0], py + corners[0][1])
+            for cx, cy in corners[1:]:
+                self.ctx.line_to(px + cx, py + cy)
+            self.ctx.line_to(px + corners[0][0], py + corners[0][1])
+
+    def hexHolesPositions(self, x, y, r, b, skip=None):
+        """
+        Centers of holes in a hex pattern filling a rectangle
 
         :param x: width
         :param y: height
-        :param settings:  (Default value = None)
+        :param r: radius of holes
+        :param b: space between holes
         :param skip:  (Default value = None) function to check if hole should be present
-               gets x, y, r, b, posx, posy
-
+               gets x, y, r, b, posx, posy. With NumPy installed posx and
+               posy are arrays of all positions and the result is used as
+               mask - use arithmetic and combine comparisons with & and |
+               so it works for single values and arrays alike.
+        :return: list of (posx, posy)
 
         """
-        if settings is None:
-            settings = self.hexHolesSettings
-        r, b, style = settings
-
         w = r + b / 2.0
         dist = w * math.cos(math.pi / 6.0)
 
@@ -1343,6 +1570,23 @@ class Boxes:
         lx = (x - (2 * r + (cx - 2) * w)) / 2.0
         ly = (y - (2 * r + ((cy // 2) * 2) * dist - 2 * dist)) / 2.0
 
+        if numpy is not None:
+            # whole grid at once - rows alternate between cx // 2 and
+            # (cx - 1) // 2 holes
+            rows = numpy.arange(cy // 2)
+            counts = numpy.maximum((cx - rows % 2) // 2, 0)
+            i = numpy.repeat(rows, counts)
+            j = (numpy.arange(counts.sum()) -
+                 numpy.repeat(numpy.cumsum(counts) - counts, counts))
+            px = 2 * j * w + r + lx + (i % 2) * w
+            py = i * 2 * dist + r + ly
+            if skip:
+                keep = ~numpy.broadcast_to(numpy.asarray(
+                    skip(x, y, r, b, px, py), dtype=bool), px.shape)
+                px, py = px[keep], py[keep]
+            return list(zip(px.tolist(), py.tolist()))
+
+        positions = []
         for i in range(cy // 2):
             for j in range((cx - (i % 2)) // 2):
                 px = 2 * j * w + r + lx
@@ -1351,7 +1595,30 @@ class Boxes:
                     px += w
                 if skip and skip(x, y, r, b, px, py):
                     continue
-                self.hole(px, py, r)
+                positions.append((px, py))
+        return positions
+
+    def hexHolesRectangle(self, x, y, settings=None, skip=None):
+        """Fills a rectangle with holes in a hex pattern.
+
+        Settings have:
+        r : radius of holes
+        b : space between holes
+        style : what types of holes: "circle", "hex" or "square"
+
+        :param x: width
+        :param y: height
+        :param settings:  (Default value = None)
+        :param skip:  (Default value = None) function to check if hole should be present
+               gets x, y, r, b, posx, posy
+
+
+        """
+        if settings is None:
+            settings = self.hexHolesSettings
+        r, b, style = settings
+
+        self.holeField(self.hexHolesPositions(x, y, r, b, skip), r, style)
 
     def __skipcircle(self, x, y, r, b, posx, posy):
         cx, cy = x / 2.0, y / 2.0
@@ -1396,9 +1663,9 @@ class Boxes:
             wx = 0.5 * x - rc - r
             wy = 0.5 * y - rc - r
 
-            if (posx <= wx) or (posy <= wx):
-                return 0
-            return dist(posx - wx, posy - wy) > rc
+            # for single positions and arrays of them
+            return ((posx > wx) & (posy > wx) &
+                    (dist(posx - wx, posy - wy) > rc))
 
         self.hexHolesRectangle(x, y, settings, skip=skip)
 
@@ -1429,12 +1696,12 @@ class Boxes:
         dist = w * math.cos(math.pi / 6.0)
 
         self.moveTo(h / 2.0 - (cy // 2) * 2 * w, h / 2.0)
-        for j in range(cy):
-            self.hole(2 * j * w, 0, r)
-        for i in range(1, cy / 2 + 1):
+        positions = [(2 * j * w, 0) for j in range(cy)]
+        for i in range(1, cy // 2 + 1):
             for j in range(cy - i):
-                self.hole(j * 2 * w + i * w, i * 2 * dist, r)
-                self.hole(j * 2 * w + i * w, -i * 2 * dist, r)
+                positions.append((j * 2 * w + i * w, i * 2 * dist))
+                positions.append((j * 2 * w + i * w, -i * 2 * dist))
+        self.holeField(positions, r, style)
 
     def flex2D(self, x, y, width=1):
         """
@@ -2169,6 +2436,50 @@ class Boxes:
             for i in range(width):
                 part(*l, **kw)
 
+    def instanced(self, f):
+        """Wrap a part function to draw it only once
+
+        Later calls with the same parameters (including move) place a
+        copy of the first drawing at the current position instead of
+        calling f again. SVG output references the copies with <use>
+        unless flatten is set. Only for parts that always draw the
+        same for the same parameters.
+
+        :param f: function to wrap
+        """
+        cache = {}
+
+        @wraps(f)
+        def r(*l, **kw):
+            key = (l, tuple(sorted(kw.items())))
+            try:
+                hash(key)
+            except TypeError:
+                return f(*l, **kw)
+            ctx, surface = self.ctx, self.surface
+            m = ctx.get_matrix()
+            if not drawing.conformal(m):
+                return f(*l, **kw)
+            ctx.stroke()
+            if key in cache:
+                symbol, m0, m1, pt, result = cache[key]
+                t = drawing.multiply(m, drawing.invert(m0))
+                if symbol is not None:
+                    surface.addInstance(symbol, t)
+                ctx.set_matrix(drawing.multiply(t, m1))
+                ctx.move_to(*pt)
+                return result
+            start = (len(surface.paths), len(surface.texts),
+                     len(surface.parts))
+            result = f(*l, **kw)
+            ctx.stroke()
+            symbol = surface.addSymbol(*start)
+            cache[key] = (symbol, m, ctx.get_matrix(),
+                          ctx.get_current_point(), result)
+            ctx.move_to(*cache[key][3])
+            return result
+        return r
+
     def mirrorX(self, f, offset=0.0):
         """Wrap a function to draw mirrored at the y axis
 
@@ -0,0 +1,160 @@
+# Copyright (C) 2013-2020 Florian Festi
+#
+#   This program is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Common line cutting
+
+Parts placed with only the kerf between them (Boxes.spacing = 2 *
+burn) share the cut along their straight edges. mergeLines() removes
+the straight line segments (or pieces of them) that are already cut by
+another segment of the same color so the laser passes there only once.
+"""
+
+import math
+from boxes import drawing
+
+def _line(p, q):
+    """Direction (0..pi), distance from the origin and unit vector of
+    the line through p and q"""
+    dx, dy = q[0] - p[0], q[1] - p[1]
+    angle = math.atan2(dy, dx)
+    if angle < 0:
+        angle += math.pi
+    if angle >= math.pi - 1E-9:
+        angle = 0.0
+    ux, uy = math.cos(angle), math.sin(angle)
+    return angle, p[1] * ux - p[0] * uy, (ux, uy)
+
+class _Lines:
+    """Segments grouped by the line they lie on
+
+    Lines closer than tolerance (and tolerance / 100 in angle) are the
+    same. They are kept in buckets of that size and the neighboring
+    buckets are searched, too. So lines next to a bucket border are
+    still found. Lines near angle 0 and pi have opposite directions
+    and offsets.
+    """
+
+    def __init__(self, tolerance):
+        self.tolerance = tolerance
+        self.angletol = tolerance / 100.0
+        self.n = int(math.ceil(math.pi / self.angletol))
+        self.buckets = {} # (angle nr, offset nr) -> lines
+        self.lines = [] # [angle, offset, unit vector, segments]
+
+    def _same(self, line, angle, d):
+        da = abs(angle - line[0])
+        if da > 0.5 * math.pi: # on the other side of 0/pi
+            da = math.pi - da
+            d = -d
+        return da <= self.angletol and abs(d - line[1]) <= self.tolerance
+
+    def add(self, p, q, segment):
+        """Add segment from p to q. Return the unit vector of its line"""
+        angle, d, u = _line(p, q)
+        ia = int(angle // self.angletol)
+        for na in (ia - 1, ia, ia + 1):
+            dd = d
+            if not 0 <= na < self.n:
+                na %= self.n
+                dd = -d
+            nd = int(math.floor(dd / self.tolerance))
+            for key in ((na, nd - 1), (na, nd), (na, nd + 1)):
+                for line in self.buckets.get(key, ()):
+                    if self._same(line, angle, d):
+                        line[3].append(segment)
+                        return line[2]
+        line = [angle, d, u, [segment]]
+        self.buckets.setdefault(
+            (ia, int(math.floor(d / self.tolerance))), []).append(line)
+        self.lines.append(line)
+        return u
+
+def mergeLines(surface, tolerance=0.01):
+    """Remove straight segments of surface that are covered by other
+    segments of the same color. Modifies the paths in place.
+
+    :param tolerance: (Default value = 0.01) max distance of lines in mm that are considered the same
+    :return: length of the removed cuts in mm
+    """
+    lines = {} # color -> _Lines
+    for pnr, path in enumerate(surface.paths):
+        pos = None
+        for cnr, c in enumerate(path.commands):
+            if c[0] == "L" and pos is not None:
+                p, q = pos, c[1:3]
+                length = ((q[0] - p[0]) ** 2 + (q[1] - p[1]) ** 2) ** 0.5
+                if length > tolerance:
+                    color = tuple(path.color)
+                    if color not in lines:
+                        lines[color] = _Lines(tolerance)
+                    lines[color].add(p, q, (pnr, cnr, p, q))
+            if c[0] == "A":
+                xc, yc, r, a1, a2 = c[1:]
+                pos = (xc + r * math.cos(a2), yc + r * math.sin(a2))
+            else:
+                pos = c[-2:]
+
+    replace = {} # (path nr, command nr) -> pieces still to cut
+    removed = 0.0
+    for angle, d, (ux, uy), segments in (
+            line for l in lines.values() for line in l.lines):
+        if len(segments) < 2:
+            continue
+        cut = [] # intervals on the line already cut
+        for pnr, cnr, p, q in segments:
+            t1, t2 = p[0] * ux + p[1] * uy, q[0] * ux + q[1] * uy
+            lo, hi = min(t1, t2), max(t1, t2)
+            # parts of [lo, hi] not cut yet
+            pieces = [(lo, hi)]
+            for c1, c2 in cut:
+                new = []
+                for a, b in pieces:
+                    if c2 <= a or c1 >= b:
+                        new.append((a, b))
+                        continue
+                    if c1 > a:
+                        new.append((a, c1))
+                    if c2 < b:
+                        new.append((c2, b))
+                pieces = [(a, b) for a, b in new if b - a > tolerance]
+            cut.append((lo, hi))
+            if pieces == [(lo, hi)]:
+                continue
+            removed += (hi - lo) - sum(b - a for a, b in pieces)
+            # back to points in the direction of the segment
+            def point(t):
+                s = (t - t1) / (t2 - t1)
+                return (p[0] + s * (q[0] - p[0]), p[1] + s * (q[1] - p[1]))
+            if t2 < t1:
+                pieces = [(b, a) for a, b in reversed(pieces)]
+            replace[(pnr, cnr)] = [(point(a), point(b)) for a, b in pieces]
+
+    if not replace:
+        return 0.0
+    for pnr in sorted(set(pnr for pnr, cnr in replace)):
+        path = surface.paths[pnr]
+        commands = []
+        for cnr, c in enumerate(path.commands):
+            if (pnr, cnr) not in replace:
+                commands.append(c)
+                continue
+            for a, b in replace[(pnr, cnr)]:
+                commands.append(("M",) + a)
+                commands.append(("L",) + b)
+            commands.append(("M",) + c[1:3])
+        surface.paths[pnr] = drawing.Path(commands, path.color, path.width)
+    # changed paths are no longer copies of their symbols
+    surface.flatten(set(pnr for pnr, cnr in replace))
+    return removed
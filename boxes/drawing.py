@@ -0,0 +1,527 @@
+#!/usr/bin/env python3
+# Copyright (C) 2013-2020 Florian Festi
+#
+#   This program is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""In memory recording of the drawing operations
+
+Context implements the part of the cairo.Context API that is used by
+Boxes, the edges and the parts. Instead of rasterizing or writing a file
+it records the stroked paths in absolute coordinates (mm, y pointing
+up) into a Surface. The serializers in boxes.formats turn a Surface
+into the different output formats.
+"""
+
+import math
+
+EPS = 1E-9
+
+def multiply(m1, m2):
+    """Affine matrix (a, b, c, d, e, f) applying m2 first and then m1"""
+    a, b, c, d, e, f = m1
+    a2, b2, c2, d2, e2, f2 = m2
+    return (a * a2 + c * b2, b * a2 + d * b2,
+            a * c2 + c * d2, b * c2 + d * d2,
+            a * e2 + c * f2 + e, b * e2 + d * f2 + f)
+
+def invert(m):
+    a, b, c, d, e, f = m
+    det = a * d - b * c
+    return (d / det, -b / det, -c / det, a / det,
+            (c * f - d * e) / det, (b * e - a * f) / det)
+
+def conformal(m):
+    """True if m keeps circles circles (rotation, mirror, uniform scale)"""
+    a, b, c, d = m[:4]
+    return (abs(a * a + b * b - c * c - d * d) < EPS and
+            abs(a * c + b * d) < EPS)
+
+class Extend:
+    """Bounding box that is grown point by point"""
+
+    def __init__(self):
+        self.minx = self.miny = float("inf")
+        self.maxx = self.maxy = float("-inf")
+
+    def __bool__(self):
+        return self.minx <= self.maxx
+
+    def addPoint(self, x, y):
+        if x < self.minx:
+            self.minx = x
+        if x > self.maxx:
+            self.maxx = x
+        if y < self.miny:
+            self.miny = y
+        if y > self.maxy:
+            self.maxy = y
+
+    def addExtend(self, extend):
+        if extend:
+            self.addPoint(extend.minx, extend.miny)
+            self.addPoint(extend.maxx, extend.maxy)
+
+    @property
+    def width(self):
+        return self.maxx - self.minx if self else 0.0
+
+    @property
+    def height(self):
+        return self.maxy - self.miny if self else 0.0
+
+class Path:
+    """Stroked path
+
+    commands is a list of tuples in absolute coordinates:
+
+    * ("M", x, y) -- move to
+    * ("L", x, y) -- line to
+    * ("C", x1, y1, x2, y2, x3, y3) -- cubic bezier
+    * ("A", xc, yc, r, a1, a2) -- circular arc from angle a1 to a2 (rad),
+      counter clockwise if a2 > a1
+    """
+
+    def __init__(self, commands, color, width):
+        self.commands = commands
+        self.color = color
+        self.width = width
+        self.extend = Extend()
+        last = None
+        for c in commands:
+            if c[0] == "M":
+                last = c
+                continue
+            if last is not None:
+                # only moves that are followed by drawing count
+                self._addCommand(last)
+                last = None
+            self._addCommand(c)
+
+    def _addCommand(self, c):
+        e = self.extend
+        if c[0] == "A":
+            xc, yc, r, a1, a2 = c[1:]
+            for a in (a1, a2):
+                e.addPoint(xc + r * math.cos(a), yc + r * math.sin(a))
+            lo, hi = min(a1, a2), max(a1, a2)
+            # axis extremes inside the sweep
+            k = math.ceil(lo / (0.5 * math.pi))
+            while k * 0.5 * math.pi <= hi:
+                a = k * 0.5 * math.pi
+                e.addPoint(xc + r * math.cos(a), yc + r * math.sin(a))
+                k += 1
+        else:
+            for i in range(1, len(c), 2):
+                e.addPoint(c[i], c[i+1])
+
+    def transformed(self, m):
+        """Copy with the conformal affine matrix m = (a, b, c, d, e, f)
+        applied"""
+        a, b, c, d, e, f = m
+        det = a * d - b * c
+        rot = math.atan2(b, a)
+        scale = abs(det) ** 0.5
+        commands = []
+        for cmd in self.commands:
+            if cmd[0] == "A":
+                xc, yc, r, a1, a2 = cmd[1:]
+                if det > 0:
+                    a1, a2 = rot + a1, rot + a2
+                else:
+                    a1, a2 = rot - a1, rot - a2
+                commands.append(("A", a * xc + c * yc + e, b * xc + d * yc + f,
+                                 r * scale, a1, a2))
+            else:
+                result = [cmd[0]]
+                for i in range(1, len(cmd), 2):
+                    x, y = cmd[i], cmd[i+1]
+                    result.extend((a * x + c * y + e, b * x + d * y + f))
+                commands.append(tuple(result))
+        return Path(commands, self.color, self.width)
+
+    def points(self):
+        """End points of all commands"""
+        for c in self.commands:
+            if c[0] == "A":
+                xc, yc, r, a1, a2 = c[1:]
+                yield (xc + r * math.cos(a2), yc + r * math.sin(a2))
+            else:
+                yield c[-2:]
+
+    def length(self, tolerance=0.05):
+        """Length of the drawn lines - without the moves. Lines and arcs
+        are measured exactly, only curves are flattened.
+
+        :param tolerance: (Default value = 0.05) maximal deviation of flattened curves in mm
+        """
+        length = 0.0
+        x, y = 0.0, 0.0
+        for c, (nx, ny) in zip(self.commands, self.points()):
+            if c[0] == "L":
+                length += math.hypot(nx - x, ny - y)
+            elif c[0] == "A":
+                length += c[3] * abs(c[5] - c[4])
+            elif c[0] == "C":
+                for px, py in bezierPoints(x, y, *c[1:], tolerance=tolerance):
+                    length += math.hypot(px - x, py - y)
+                    x, y = px, py
+            x, y = nx, ny
+        return length
+
+def bezierPoints(x0, y0, x1, y1, x2, y2, x3, y3, tolerance=0.1):
+    """Flatten a cubic bezier into points (without the start point)
+
+    :param tolerance: (Default value = 0.1) maximal deviation in mm
+    """
+    # second differences bound the distance to the chords
+    dd = max(abs(x0 - 2*x1 + x2), abs(y0 - 2*y1 + y2),
+             abs(x1 - 2*x2 + x3), abs(y1 - 2*y2 + y3))
+    n = max(1, int(math.ceil((0.75 * dd / tolerance) ** 0.5)))
+    result = []
+    for i in range(1, n + 1):
+        t = i / n
+        mt = 1 - t
+        a, b, c, d = mt**3, 3 * mt**2 * t, 3 * mt * t**2, t**3
+        result.append((a*x0 + b*x1 + c*x2 + d*x3, a*y0 + b*y1 + c*y2 + d*y3))
+    return result
+
+class Text:
+    """Text placed at x, y with the linear part of the transformation
+    matrix (a, b, c, d) as in cairo"""
+
+    def __init__(self, text, x, y, matrix, fontsize, color):
+        self.text = text
+        self.x = x
+        self.y = y
+        self.matrix = matrix
+        self.fontsize = fontsize
+        self.color = color
+        self.extend = Extend()
+        w, h = textSize(text, fontsize)
+        a, b, c, d = matrix
+        for tx, ty in ((0, 0), (w, 0), (0, -h), (w, -h)):
+            self.extend.addPoint(x + a * tx + c * ty, y + b * tx + d * ty)
+
+    def transformed(self, m):
+        """Copy with the affine matrix m = (a, b, c, d, e, f) applied"""
+        a, b, c, d, e, f = m
+        ta, tb, tc, td = self.matrix
+        return Text(self.text, a * self.x + c * self.y + e,
+                    b * self.x + d * self.y + f,
+                    (a * ta + c * tb, b * ta + d * tb,
+                     a * tc + c * td, b * tc + d * td),
+                    self.fontsize, self.color)
+
+def textSize(text, fontsize):
+    """Estimate width and height of a line of text in sans-serif.
+
+    There is no font rendering available without cairo. This is
+    close enough for aligning labels.
+    """
+    return 0.55 * fontsize * len(text), 0.72 * fontsize
+
+class Symbol:
+    """Drawing that is placed several times - see Surface.addSymbol()"""
+
+    def __init__(self, nr, paths, texts, parts):
+        self.nr = nr
+        self.paths = paths # (first, end) index range in Surface.paths
+        self.texts = texts # same for Surface.texts
+        self.parts = parts # entries of Surface.parts within the ranges
+
+class Instance:
+    """Placement of a Symbol: paths and texts in the given index ranges
+    are the symbol's paths and texts transformed by matrix"""
+
+    def __init__(self, symbol, matrix, paths, texts):
+        self.symbol = symbol
+        self.matrix = matrix
+        self.paths = paths
+        self.texts = texts
+
+class Surface:
+    """Recorded drawing - collects Paths and Texts
+
+    .parts lists the parts as (first path, end path, first text, end
+    text) index ranges as marked with .beginPart() and .endPart().
+
+    .paths and .texts always contain the complete drawing. .instances
+    additionally tells which of them are copies of a Symbol, so writers
+    can reference the symbol instead of repeating it (SVG <use>).
+    """
+
+    def __init__(self):
+        self.paths = []
+        self.texts = []
+        self.extend = Extend()
+        self.parts = []
+        self._partdepth = 0
+        self._partstart = None
+        self.symbols = []
+        self.instances = []
+
+    def beginPart(self):
+        """Mark the start of a part. Parts drawn within a part belong to it."""
+        if not self._partdepth:
+            self._partstart = (len(self.paths), len(self.texts))
+        self._partdepth += 1
+
+    def endPart(self):
+        if not self._partdepth:
+            return
+        self._partdepth -= 1
+        if not self._partdepth:
+            p, t = self._partstart
+            self.parts.append((p, len(self.paths), t, len(self.texts)))
+
+    def partExtend(self, part):
+        """Extend of the paths and texts of part (an entry of .parts)"""
+        p0, p1, t0, t1 = part
+        extend = Extend()
+        for item in self.paths[p0:p1] + self.texts[t0:t1]:
+            extend.addExtend(item.extend)
+        return extend
+
+    def addPath(self, path):
+        self.paths.append(path)
+        self.extend.addExtend(path.extend)
+
+    def addText(self, text):
+        self.texts.append(text)
+        self.extend.addExtend(text.extend)
+
+    def addSymbol(self, path, text, part):
+        """Turn everything added since len(.paths) was path, len(.texts)
+        was text and len(.parts) was part into a Symbol. The drawing
+        itself becomes its first Instance.
+
+        :return: the Symbol or None if nothing was drawn
+        """
+        paths, texts = (path, len(self.paths)), (text, len(self.texts))
+        if paths[0] == paths[1] and texts[0] == texts[1]:
+            return None
+        # instances within are part of the symbol now
+        self.instances = [
+            i for i in self.instances
+            if not (paths[0] <= i.paths[0] and i.paths[1] <= paths[1] and
+                    texts[0] <= i.texts[0] and i.texts[1] <= texts[1])]
+        symbol = Symbol(len(self.symbols), paths, texts, self.parts[part:])
+        self.symbols.append(symbol)
+        self.instances.append(Instance(
+            symbol, (1.0, 0.0, 0.0, 1.0, 0.0, 0.0), paths, texts))
+        return symbol
+
+    def addInstance(self, symbol, matrix):
+        """Add a copy of symbol transformed by the conformal matrix"""
+        p0, t0 = len(self.paths), len(self.texts)
+        for path in self.paths[symbol.paths[0]:symbol.paths[1]]:
+            self.addPath(path.transformed(matrix))
+        for text in self.texts[symbol.texts[0]:symbol.texts[1]]:
+            self.addText(text.transformed(matrix))
+        dp, dt = p0 - symbol.paths[0], t0 - symbol.texts[0]
+        if not self._partdepth:
+            for ps, pe, ts, te in symbol.parts:
+                self.parts.append((ps + dp, pe + dp, ts + dt, te + dt))
+        self.instances.append(Instance(
+            symbol, matrix, (p0, len(self.paths)), (t0, len(self.texts))))
+
+    def flatten(self, paths=None):
+        """Forget about instances - e.g. because their paths got changed
+
+        :param paths: (Default value = None) only instances containing these path indices
+        """
+        if paths is None:
+            self.instances = []
+            return
+        self.instances = [i for i in self.instances
+                          if not any(i.paths[0] <= p < i.paths[1]
+                                     for p in paths)]
+
+    def flush(self):
+        pass
+
+    def finish(self):
+        pass
+
+class Context:
+    """Recording replacement for the cairo.Context methods used in Boxes.py"""
+
+    def __init__(self, surface):
+        self.surface = surface
+        self._m = (1.0, 0.0, 0.0, 1.0, 0.0, 0.0) # a b c d e f as in cairo
+        self._color = (0.0, 0.0, 0.0)
+        self._line_width = 2.0
+        self._fontsize = 10.0
+        self._stack = []
+        self._path = []
+        self._xy = None # current point in absolute coordinates
+
+    # state
+
+    def save(self):
+        self._stack.append((self._m, self._color, self._line_width,
+                            self._fontsize))
+
+    def restore(self):
+        (self._m, self._color, self._line_width,
+         self._fontsize) = self._stack.pop()
+
+    def set_source_rgb(self, r, g, b):
+        self._color = (r, g, b)
+
+    def set_line_width(self, width):
+        self._line_width = width
+
+    def select_font_face(self, family, *args):
+        pass
+
+    def set_font_size(self, size):
+        self._fontsize = size
+
+    # transformations
+
+    def _transform(self, x, y):
+        a, b, c, d, e, f = self._m
+        return (a * x + c * y + e, b * x + d * y + f)
+
+    def _inverse(self, x, y):
+        a, b, c, d, e, f = self._m
+        det = a * d - b * c
+        x -= e
+        y -= f
+        return ((d * x - c * y) / det, (a * y - b * x) / det)
+
+    def _multiply(self, a2, b2, c2, d2, e2, f2):
+        a, b, c, d, e, f = self._m
+        self._m = (a * a2 + c * b2, b * a2 + d * b2,
+                   a * c2 + c * d2, b * c2 + d * d2,
+                   a * e2 + c * f2 + e, b * e2 + d * f2 + f)
+
+    def translate(self, x, y):
+        self._multiply(1.0, 0.0, 0.0, 1.0, x, y)
+
+    def rotate(self, angle):
+        c, s = math.cos(angle), math.sin(angle)
+        self._multiply(c, s, -s, c, 0.0, 0.0)
+
+    def scale(self, sx, sy):
+        self._multiply(sx, 0.0, 0.0, sy, 0.0, 0.0)
+
+    def get_matrix(self):
+        return self._m
+
+    def set_matrix(self, m):
+        self._m = tuple(m)
+
+    def get_current_point(self):
+        if self._xy is None:
+            return (0.0, 0.0)
+        return self._inverse(*self._xy)
+
+    # path construction
+
+    def move_to(self, x, y):
+        self._xy = self._transform(x, y)
+        self._path.append(("M",) + self._xy)
+
+    def line_to(self, x, y):
+        if self._xy is None:
+            return self.move_to(x, y)
+        self._xy = self._transform(x, y)
+        self._path.append(("L",) + self._xy)
+
+    def curve_to(self, x1, y1, x2, y2, x3, y3):
+        if self._xy is None:
+            self.move_to(x1, y1)
+        self._xy = self._transform(x3, y3)
+        self._path.append(("C",) + self._transform(x1, y1) +
+                          self._transform(x2, y2) + self._xy)
+
+    def rectangle(self, x, y, width, height):
+        self.move_to(x, y)
+        self.line_to(x + width, y)
+        self.line_to(x + width, y + height)
+        self.line_to(x, y + height)
+        self.line_to(x, y)
+
+    def _conformal(self):
+        return conformal(self._m)
+
+    def _arc(self, xc, yc, r, a1, a2):
+        start = (xc + r * math.cos(a1), yc + r * math.sin(a1))
+        if self._xy is None:
+            self.move_to(*start)
+        else:
+            sx, sy = self._transform(*start)
+            if abs(sx - self._xy[0]) > EPS or abs(sy - self._xy[1]) > EPS:
+                self.line_to(*start)
+
+        if self._conformal():
+            a, b, c, d = self._m[:4]
+            det = a * d - b * c
+            rot = math.atan2(b, a)
+            if det > 0:
+                b1, b2 = rot + a1, rot + a2
+            else:
+                b1, b2 = rot - a1, rot - a2
+            cx, cy = self._transform(xc, yc)
+            self._path.append(("A", cx, cy, r * abs(det) ** 0.5, b1, b2))
+            self._xy = self._transform(xc + r * math.cos(a2),
+                                       yc + r * math.sin(a2))
+            return
+
+        # distorted: approximate with beziers of at most 90 degrees
+        n = max(1, int(math.ceil(abs(a2 - a1) / (0.5 * math.pi) - EPS)))
+        da = (a2 - a1) / n
+        k = 4.0 / 3.0 * math.tan(da / 4.0)
+        for i in range(n):
+            t1 = a1 + i * da
+            t2 = t1 + da
+            c1, s1 = math.cos(t1), math.sin(t1)
+            c2, s2 = math.cos(t2), math.sin(t2)
+            self.curve_to(xc + r * (c1 - k * s1), yc + r * (s1 + k * c1),
+                          xc + r * (c2 + k * s2), yc + r * (s2 - k * c2),
+                          xc + r * c2, yc + r * s2)
+
+    def arc(self, xc, yc, radius, angle1, angle2):
+        while angle2 < angle1:
+            angle2 += 2 * math.pi
+        self._arc(xc, yc, radius, angle1, angle2)
+
+    def arc_negative(self, xc, yc, radius, angle1, angle2):
+        while angle2 > angle1:
+            angle2 -= 2 * math.pi
+        self._arc(xc, yc, radius, angle1, angle2)
+
+    def stroke(self):
+        if any(c[0] != "M" for c in self._path):
+            a, b, c, d = self._m[:4]
+            width = self._line_width * abs(a * d - b * c) ** 0.5
+            self.surface.addPath(Path(self._path, self._color, width))
+        self._path = []
+        self._xy = None
+
+    # text
+
+    def text_extents(self, text):
+        width, height = textSize(text, self._fontsize)
+        return (0.0, -height, width, height, width, 0.0)
+
+    def show_text(self, text):
+        x, y = self.get_current_point()
+        self.surface.addText(Text(text, *self._transform(x, y),
+                                  matrix=self._m[:4],
+                                  fontsize=self._fontsize,
+                                  color=self._color))
+        self._xy = self._transform(x + textSize(text, self._fontsize)[0], y)
@@ -1938,15 +1938,16 @@ class RackEdge(BaseEdge):
         self.gear = gears.Gears(boxes)
 
     def __call__(self, length, **kw):
-        params = self.settings.values.copy()
-        params["draw_rack"] = True
-        params["rack_base_height"] = -1E-36
-        params["rack_teeth_length"] = int(length // params["dimension"])
-        params["rack_base_tab"] = (length - (params["rack_teeth_length"]) * params["dimension"]) / 2.0
+        dimension = self.settings.dimension
+        teeth_length = int(length // dimension)
+        options = gears.GearOptions(
+            drawrack=True, base_height=-1E-36, teeth_length=teeth_length,
+            base_tab=(length - teeth_length * dimension) / 2.0,
+            **self.settings.values)
         s_tmp = self.boxes.spacing
         self.boxes.spacing = 0
         self.moveTo(length, 0, 180)
-        self.gear(move="", **params)
+        self.gear(move="", options=options)
         self.moveTo(0, 0, 180)
         self.boxes.spacing = s_tmp
 
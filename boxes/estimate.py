@@ -0,0 +1,134 @@
+# Copyright (C) 2013-2020 Florian Festi
+#
+#   This program is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Estimate cut length and machine time of a recorded drawing
+
+The drawing is split into contours and ordered like for the gcode and
+plt formats (see boxes.toolpath). Each contour is pierced once and
+cut .passes times without stopping in between - closed contours are
+repeated, open ones cut back and forth. The moves are timed with a
+simple motion planner: constant acceleration, full stop at the ends of
+the contours and at corners as sharp as the junction deviation
+requires (as in GRBL).
+"""
+
+import math
+from boxes import toolpath
+
+class Machine:
+    """Motion parameters of a laser cutter (or other machine)
+
+    All attributes can be passed as keyword arguments. None keeps the
+    default.
+    """
+
+    feed = 1000.0 # mm/min cutting speed
+    rapid = 6000.0 # mm/min speed of the moves between contours
+    acceleration = 1000.0 # mm/s^2
+    junction = 0.01 # mm junction deviation - allowed speed at corners
+    pierce = 0.0 # s per contour for switching on and piercing
+    passes = 1 # times each contour is cut
+    tolerance = 0.05 # mm max deviation of flattened curves
+    skip_colors = ((1.0, 1.0, 1.0),) # colors that are not cut (white)
+
+    def __init__(self, **settings):
+        for name, value in settings.items():
+            if not hasattr(self, name):
+                raise ValueError("Unknown machine setting: %s" % name)
+            if value is None:
+                continue
+            try:
+                setattr(self, name, type(getattr(self, name))(value))
+            except ValueError:
+                raise ValueError("Invalid value for %s: %r" % (name, value))
+        for name in ("feed", "rapid", "acceleration"):
+            if getattr(self, name) <= 0:
+                raise ValueError("%s must be positive" % name)
+
+    def estimate(self, surfaces):
+        """Return dict with "cutlength" and "travel" (mm), "pierces",
+        "cuttime", "traveltime", "piercetime" and "time" (s) for a list
+        of drawing.Surfaces - one per sheet, each cut as a job of its own
+        starting and ending at the origin"""
+        cutlength = travel = cuttime = traveltime = 0.0
+        pierces = 0
+        feed, rapid = self.feed / 60.0, self.rapid / 60.0
+        for surface in surfaces:
+            pos = (0.0, 0.0)
+            for color, contours in toolpath.toolpaths(surface, self.tolerance,
+                                                       self.skip_colors):
+                for contour in contours:
+                    d = toolpath.dist(pos, contour.start)
+                    travel += d
+                    traveltime += self.moveTime(d, rapid)
+                    # all passes as one move - as the gcode and plt formats
+                    points = toolpath.passPoints(contour, self.passes)
+                    cuttime += self.contourTime(points, feed)
+                    pierces += 1
+                    pos = points[-1]
+            d = toolpath.dist(pos, (0.0, 0.0))
+            travel += d
+            traveltime += self.moveTime(d, rapid)
+            # exact lines and arcs - as Boxes.dryRun()
+            cutlength += self.passes * sum(
+                path.length(self.tolerance) for path in surface.paths
+                if tuple(path.color) not in self.skip_colors)
+        piercetime = pierces * self.pierce
+        return {"cutlength" : cutlength, "travel" : travel,
+                "pierces" : pierces, "cuttime" : cuttime,
+                "traveltime" : traveltime, "piercetime" : piercetime,
+                "time" : cuttime + traveltime + piercetime}
+
+    def moveTime(self, length, speed, v0=0.0, v1=0.0):
+        """Time for a straight move from speed v0 to v1 that is at
+        most speed (all in mm/s)"""
+        a = self.acceleration
+        peak2 = a * length + 0.5 * (v0 * v0 + v1 * v1)
+        if peak2 >= speed * speed:
+            cruise = length - (2 * speed * speed - v0 * v0 - v1 * v1) / (2 * a)
+            return (2 * speed - v0 - v1) / a + cruise / speed
+        peak = math.sqrt(peak2)
+        return (2 * peak - v0 - v1) / a
+
+    def contourTime(self, points, speed):
+        """Time for cutting along points at most at speed (mm/s)"""
+        a = self.acceleration
+        segments = []
+        for (x0, y0), (x1, y1) in zip(points, points[1:]):
+            length = math.hypot(x1 - x0, y1 - y0)
+            if length > 1E-9:
+                segments.append((length, (x1 - x0) / length,
+                                 (y1 - y0) / length))
+        if not segments:
+            return 0.0
+        # max speed^2 at the junctions - from the junction deviation
+        v2 = [0.0]
+        for (l0, dx0, dy0), (l1, dx1, dy1) in zip(segments, segments[1:]):
+            cos = -(dx0 * dx1 + dy0 * dy1) # angle between the segments
+            sin_half = math.sqrt(max(0.0, 0.5 * (1.0 - cos)))
+            if sin_half > 1.0 - 1E-6: # straight
+                v2.append(speed * speed)
+            else:
+                v2.append(min(speed * speed, a * self.junction * sin_half /
+                              (1.0 - sin_half)))
+        v2.append(0.0)
+        # limit by what acceleration and deceleration allow
+        for i, (length, dx, dy) in enumerate(segments):
+            v2[i+1] = min(v2[i+1], v2[i] + 2 * a * length)
+        for i in range(len(segments) - 1, -1, -1):
+            v2[i] = min(v2[i], v2[i+1] + 2 * a * segments[i][0])
+        return sum(self.moveTime(length, speed, math.sqrt(v2[i]),
+                                 math.sqrt(v2[i+1]))
+                   for i, (length, dx, dy) in enumerate(segments))
@@ -18,46 +18,479 @@
 import subprocess
 import tempfile
 import os
-import cairo
+import io
+import math
 import re
+from contextlib import contextmanager
+from xml.sax.saxutils import escape
+
 from boxes import svgutil
+from boxes import drawing
+from boxes import toolpath
+
+def _cairo():
+    """cairo is only needed for the formats that are not written natively"""
+    try:
+        import cairocffi
+
+        cairocffi.install_as_pycairo()
+    except ImportError:
+        pass
+    import cairo
+    return cairo
 
 class PSFile:
     def __init__(self, filename):
         self.filename = filename
 
     def adjustDocumentMedia(self):
-        with open(self.filename, "r+") as f:
-            s = f.read(1024)
-            m = re.search(r"%%BoundingBox: (\d+) (\d+) (\d+) (\d+)", s)
+        if hasattr(self.filename, "seek"): # binary file object
+            self._adjustDocumentMedia(self.filename)
+            return
+        with open(self.filename, "rb+") as f:
+            self._adjustDocumentMedia(f)
+
+    def _adjustDocumentMedia(self, f):
+        f.seek(0)
+        s = f.read(1024)
+        m = re.search(rb"%%BoundingBox: (\d+) (\d+) (\d+) (\d+)", s)
+
+        if not m:
+            raise ValueError("%%BoundingBox in Postscript file not found")
+
+        x1, y1, x2, y2 = m.groups()
+        m = re.search(rb"%%DocumentMedia: \d+x\d+mm ((\d+) (\d+)) 0 \(", s)
+        f.seek(m.start(1))
+        media = b"%i %i" % (int(x1) + int(x2), int(y1) + int(y2))
+        f.write(media + b" " * (len(m.group(1)) - len(media)))
+        f.seek(0, io.SEEK_END)
+
+@contextmanager
+def _textFile(target):
+    """Open target (a file name or a binary file object) for writing text"""
+    if hasattr(target, "write"):
+        f = io.TextIOWrapper(target, encoding="utf-8")
+        try:
+            yield f
+        finally:
+            f.flush()
+            f.detach() # keep target open
+    else:
+        with open(target, "w", encoding="utf-8") as f:
+            yield f
+
+def _fmt(v):
+    """Compact number formatting for path data"""
+    s = ("%.3f" % v).rstrip("0").rstrip(".")
+    return "0" if s == "-0" else s
+
+class SVGWriter:
+    """Write a recorded drawing.Surface as SVG in a single pass
+
+    The extend is tracked while drawing, so the header with the final
+    size and viewBox is written first and the paths are streamed after
+    it. Path data is written compact: no redundant moves, horizontal and
+    vertical lines as H and V and arcs as A.
+    """
+
+    margin = 10.0 # mm
+    flatten = False # write copies of symbols out instead of <use>
+
+    def __init__(self, filename):
+        self.filename = filename
+
+    def _color(self, color):
+        return "rgb(%i,%i,%i)" % tuple(int(round(255 * c)) for c in color)
+
+    def pathData(self, path, dx, dy):
+        d = []
+        cx = cy = None # current point as written
+        move = None # last move not yet written
+
+        for c in path.commands:
+            cmd = c[0]
+            if cmd == "M":
+                move = (_fmt(c[1] + dx), _fmt(dy - c[2]))
+                continue
+            if move is not None:
+                if move != (cx, cy):
+                    d.append("M %s %s" % move)
+                    cx, cy = move
+                move = None
+            if cmd == "L":
+                x, y = _fmt(c[1] + dx), _fmt(dy - c[2])
+                if x == cx and y == cy:
+                    continue
+                if y == cy:
+                    d.append("H " + x)
+                elif x == cx:
+                    d.append("V " + y)
+                else:
+                    d.append("L %s %s" % (x, y))
+                cx, cy = x, y
+            elif cmd == "C":
+                pts = [_fmt(c[i] + dx) if i % 2 else _fmt(dy - c[i])
+                       for i in range(1, 7)]
+                d.append("C " + " ".join(pts))
+                cx, cy = pts[-2:]
+            elif cmd == "A":
+                xc, yc, r, a1, a2 = c[1:]
+                if a1 == a2:
+                    continue
+                # y axis is flipped: counter clockwise becomes clockwise
+                sweep = 0 if a2 > a1 else 1
+                rs = _fmt(r)
+                # SVG can't do full circles with a single arc
+                n = max(1, int(math.ceil(abs(a2 - a1) / math.pi - 1E-9)))
+                for i in range(1, n + 1):
+                    a = a1 + (a2 - a1) * i / n
+                    cx = _fmt(xc + r * math.cos(a) + dx)
+                    cy = _fmt(dy - yc - r * math.sin(a))
+                    d.append("A %s %s 0 0 %i %s %s" % (rs, rs, sweep, cx, cy))
+        return " ".join(d)
+
+    def write(self, surface, metadata=None):
+        extend = surface.extend
+        m = self.margin
+        if extend:
+            minx, maxy = extend.minx, extend.maxy
+        else:
+            minx = maxy = 0.0
+        # full cm for convenience
+        width = 10 * math.ceil((extend.width + 2 * m) / 10)
+        height = 10 * math.ceil((extend.height + 2 * m) / 10)
+        dx, dy = m - minx, m + maxy
+
+        with _textFile(self.filename) as f:
+            f.write("""<?xml version="1.0" encoding="UTF-8"?>
+<svg xmlns="http://www.w3.org/2000/svg" xmlns:xlink="http://www.w3.org/1999/xlink" width="%imm" height="%imm" viewBox="0 0 %i %i" version="1.1">
+""" % (width, height, width, height))
+            if metadata:
+                # entities are not resolved in comments - only avoid "--"
+                text = svgutil.metadataText(metadata)
+                while "--" in text:
+                    text = text.replace("--", "- -")
+                if text.endswith("-"):
+                    text += " "
+                f.write("<!--%s-->\n" % text)
+            f.write('<g id="surface1">\n')
+            instances = [] if self.flatten else surface.instances
+            if instances:
+                f.write("<defs>\n")
+                symbols = set(i.symbol for i in instances)
+                for symbol in sorted(symbols, key=lambda s: s.nr):
+                    f.write('<symbol id="symbol%i" style="overflow:visible">\n'
+                            % symbol.nr)
+                    for path in surface.paths[slice(*symbol.paths)]:
+                        self.writePath(f, path, dx, dy)
+                    for text in surface.texts[slice(*symbol.texts)]:
+                        self.writeText(f, text, dx, dy)
+                    f.write("</symbol>\n")
+                f.write("</defs>\n")
+            # instances start at their first path (or text if they have none)
+            atpath = {i.paths[0] : i for i in instances
+                      if i.paths[0] < i.paths[1]}
+            attext = {i.texts[0] : i for i in instances
+                      if i.paths[0] == i.paths[1]}
+            nr = 0
+            while nr < len(surface.paths):
+                if nr in atpath:
+                    self.writeUse(f, atpath[nr], dx, dy)
+                    nr = atpath[nr].paths[1]
+                else:
+                    self.writePath(f, surface.paths[nr], dx, dy)
+                    nr += 1
+            skip = set()
+            for i in instances:
+                skip.update(range(*i.texts))
+            for nr, text in enumerate(surface.texts):
+                if nr in attext:
+                    self.writeUse(f, attext[nr], dx, dy)
+                if nr not in skip:
+                    self.writeText(f, text, dx, dy)
+            f.write("</g>\n</svg>\n")
+
+    def writePath(self, f, path, dx, dy):
+        d = self.pathData(path, dx, dy)
+        if not d:
+            return
+        f.write('<path style="fill:none;stroke-linecap:round;'
+                'stroke-linejoin:round;stroke:%s;stroke-width:%s" '
+                'd="%s"/>\n' % (self._color(path.color),
+                                _fmt(path.width), d))
+
+    def writeText(self, f, text, dx, dy):
+        a, b, c, d = text.matrix
+        f.write('<text transform="matrix(%s)" style="font-family:'
+                'sans-serif;font-size:%s;fill:%s">%s</text>\n' % (
+                    ",".join(_fmt(v) for v in (
+                        a, -b, c, -d, text.x + dx, dy - text.y)),
+                    _fmt(text.fontsize), self._color(text.color),
+                    escape(text.text)))
+
+    def writeUse(self, f, instance, dx, dy):
+        a, b, c, d, e, f_ = instance.matrix
+        if instance.matrix == (1.0, 0.0, 0.0, 1.0, 0.0, 0.0):
+            transform = ""
+        else:
+            # same transformation in SVG coordinates (y pointing down)
+            transform = ' transform="matrix(%s)"' % ",".join(
+                "%.6g" % (v + 0.0) if i < 4 else _fmt(v) for i, v in enumerate((
+                    a, -b, -c, d, e + dx - a * dx + c * dy,
+                    dy - f_ + b * dx - d * dy)))
+        f.write('<use xlink:href="#symbol%i"%s/>\n' % (
+            instance.symbol.nr, transform))
+
+class PonokoSVGWriter(SVGWriter):
+    """SVG for Ponoko - their templates are kept plain"""
+    flatten = True
+
+class DXFWriter:
+    """Write a recorded drawing.Surface as DXF (R12) in mm
+
+    R12 has no header variables for the units, so the coordinates are
+    plain mm.
+    Arcs become ARC entities, runs of straight lines POLYLINEs (or a
+    single LINE). Bezier curves are flattened. Colors are mapped to the
+    closest basic AutoCAD color.
+    """
+
+    colors = [
+        ((0.0, 0.0, 0.0), 7),
+        ((1.0, 0.0, 0.0), 1),
+        ((1.0, 1.0, 0.0), 2),
+        ((0.0, 1.0, 0.0), 3),
+        ((0.0, 1.0, 1.0), 4),
+        ((0.0, 0.0, 1.0), 5),
+        ((1.0, 0.0, 1.0), 6),
+        ((1.0, 1.0, 1.0), 7),
+    ]
+
+    def __init__(self, filename):
+        self.filename = filename
+
+    def _color(self, color):
+        return min(self.colors, key=lambda c: sum(
+            (a - b) ** 2 for a, b in zip(c[0], color)))[1]
 
-            if not m:
-                raise ValueError("%%BoundingBox in Postscript file not found")
+    def _group(self, f, code, value):
+        if isinstance(value, float):
+            value = "%.6f" % value
+        f.write("%3i\n%s\n" % (code, value))
 
-            x1, y1, x2, y2 = m.groups()
-            m = re.search(r"%%DocumentMedia: \d+x\d+mm ((\d+) (\d+)) 0 \(", s)
-            f.seek(m.start(1))
-            media = "%i %i" % (int(x1) + int(x2), int(y1) + int(y2))
-            f.write(media + " " * (len(m.group(1)) - len(media)))
+    def _entity(self, f, name, color, *groups):
+        g = self._group
+        g(f, 0, name)
+        g(f, 8, "0")
+        g(f, 62, color)
+        for code, value in groups:
+            g(f, code, value)
 
+    def _points(self, f, points, color):
+        if len(points) < 2:
+            return
+        if len(points) == 2:
+            (x1, y1), (x2, y2) = points
+            self._entity(f, "LINE", color, (10, x1), (20, y1), (30, 0.0),
+                         (11, x2), (21, y2), (31, 0.0))
+            return
+        closed = (abs(points[0][0] - points[-1][0]) < 1E-6 and
+                  abs(points[0][1] - points[-1][1]) < 1E-6)
+        if closed:
+            points = points[:-1]
+        self._entity(f, "POLYLINE", color, (66, 1), (10, 0.0), (20, 0.0),
+                     (30, 0.0), (70, 1 if closed else 0))
+        for x, y in points:
+            self._entity(f, "VERTEX", color, (10, x), (20, y), (30, 0.0))
+        self._group(f, 0, "SEQEND")
+
+    def _arc(self, f, arc, color):
+        xc, yc, r, a1, a2 = arc
+        if a2 < a1:
+            a1, a2 = a2, a1
+        if a2 - a1 >= 2 * math.pi - 1E-9:
+            self._entity(f, "CIRCLE", color, (10, xc), (20, yc), (30, 0.0),
+                         (40, r))
+        elif a2 > a1:
+            self._entity(f, "ARC", color, (10, xc), (20, yc), (30, 0.0),
+                         (40, r), (50, math.degrees(a1) % 360.0),
+                         (51, math.degrees(a2) % 360.0))
+
+    def writePath(self, f, path):
+        color = self._color(path.color)
+        points = []
+        arc = None # consecutive pieces of the same arc are merged
+
+        for c in path.commands:
+            cmd = c[0]
+            if cmd == "A":
+                self._points(f, points, color)
+                if (arc and max(abs(a - b) for a, b in zip(arc[:3], c[1:4]))
+                    < 1E-6 and abs(arc[4] - c[4]) < 1E-9 and
+                    (arc[4] - arc[3]) * (c[5] - c[4]) > 0):
+                    arc[4] = c[5]
+                else:
+                    if arc:
+                        self._arc(f, arc, color)
+                    arc = list(c[1:])
+                xc, yc, r = c[1:4]
+                points = [(xc + r * math.cos(c[5]), yc + r * math.sin(c[5]))]
+                continue
+            if arc and cmd != "M" and not (cmd == "L" and points[-1] == c[1:3]):
+                self._arc(f, arc, color)
+                arc = None
+            if cmd == "M":
+                self._points(f, points, color)
+                points = [c[1:3]]
+            elif cmd == "L":
+                if points[-1] != c[1:3]:
+                    points.append(c[1:3])
+            elif cmd == "C":
+                points.extend(drawing.bezierPoints(*(points[-1] + c[1:])))
+        if arc:
+            self._arc(f, arc, color)
+        self._points(f, points, color)
+
+    def write(self, surface, metadata=None):
+        g = self._group
+        with _textFile(self.filename) as f:
+            if metadata:
+                for line in svgutil.metadataText(metadata).split("\n"):
+                    if line:
+                        g(f, 999, line)
+            g(f, 0, "SECTION")
+            g(f, 2, "HEADER")
+            g(f, 9, "$ACADVER")
+            g(f, 1, "AC1009")
+            if surface.extend:
+                g(f, 9, "$EXTMIN")
+                g(f, 10, surface.extend.minx)
+                g(f, 20, surface.extend.miny)
+                g(f, 9, "$EXTMAX")
+                g(f, 10, surface.extend.maxx)
+                g(f, 20, surface.extend.maxy)
+            g(f, 0, "ENDSEC")
+            g(f, 0, "SECTION")
+            g(f, 2, "ENTITIES")
+            for path in surface.paths:
+                self.writePath(f, path)
+            for text in surface.texts:
+                a, b = text.matrix[:2]
+                self._entity(f, "TEXT", self._color(text.color),
+                             (10, text.x), (20, text.y), (30, 0.0),
+                             (40, 0.72 * text.fontsize), (1, text.text),
+                             (50, math.degrees(math.atan2(b, a))))
+            g(f, 0, "ENDSEC")
+            g(f, 0, "EOF")
+
+class _MachineWriter:
+    """Base for formats that drive a machine directly (gcode, plt)
+
+    The drawing is flattened into contours that are cut in an order
+    that keeps the travel short and cuts holes before the parts around
+    them. Non black colors (marks, engravings) are done before the cuts.
+    The lower left corner of the drawing is the origin.
+    """
+
+    feed = 1000.0 # mm/min
+    power = 100.0 # %
+    passes = 1
+    tolerance = 0.05 # mm
+
+    def __init__(self, filename):
+        self.filename = filename
+
+    def toolpaths(self, surface):
+        """Return the ordered contours grouped by color as list of
+        (color, contours) relative to the origin"""
+        return toolpath.toolpaths(surface, self.tolerance)
+
+    def passPoints(self, contour):
+        """Points to visit for one contour including all passes.
+        Closed contours are repeated without lifting the tool. Open
+        contours are cut back and forth."""
+        return toolpath.passPoints(contour, self.passes)
+
+class GCodeWriter(_MachineWriter):
+    """Write G-code for laser cutters and CNC mills (GRBL dialect)
+
+    Curves are flattened into G1 moves. The laser/spindle is switched
+    on with M3 for each contour and off with M5 before each rapid move.
+    """
+
+    smax = 1000 # S value for 100% power
+
+    def write(self, surface, metadata=None):
+        s = int(round(self.power / 100.0 * self.smax))
+        with _textFile(self.filename) as f:
+            if metadata:
+                for line in svgutil.metadataText(metadata).split("\n"):
+                    if line:
+                        f.write("(%s)\n" % line.replace("(", "[").replace(")", "]"))
+            f.write("G21\nG90\nM5\n")
+            for color, contours in self.toolpaths(surface):
+                f.write("(color %s)\n" % " ".join(_fmt(c) for c in color))
+                for contour in contours:
+                    points = self.passPoints(contour)
+                    f.write("G0 X%s Y%s\n" % (_fmt(points[0][0]), _fmt(points[0][1])))
+                    f.write("M3 S%i\n" % s)
+                    f.write("G1 X%s Y%s F%s\n" % (_fmt(points[1][0]), _fmt(points[1][1]), _fmt(self.feed)))
+                    for x, y in points[2:]:
+                        f.write("X%s Y%s\n" % (_fmt(x), _fmt(y)))
+                    f.write("M5\n")
+            f.write("G0 X0 Y0\nM2\n")
+
+class HPGLWriter(_MachineWriter):
+    """Write HPGL for plotters, vinyl and laser cutters
+
+    Each color gets its own pen (in the order the colors are cut).
+    The feed is set as velocity (VS). Power can't be set in HPGL and
+    has to be configured on the machine.
+    """
+
+    units = 40 # plotter units per mm
+
+    def _xy(self, pt):
+        return "%i,%i" % (int(round(pt[0] * self.units)),
+                          int(round(pt[1] * self.units)))
+
+    def write(self, surface, metadata=None):
+        with _textFile(self.filename) as f:
+            f.write("IN;\nVS%s;\n" % _fmt(self.feed / 600.0)) # cm/s
+            for pen, (color, contours) in enumerate(self.toolpaths(surface), 1):
+                f.write("SP%i;\n" % pen)
+                for contour in contours:
+                    points = self.passPoints(contour)
+                    f.write("PU%s;\n" % self._xy(points[0]))
+                    f.write("PD%s;\n" % ",".join(self._xy(p) for p in points[1:]))
+            f.write("PU0,0;\nSP0;\n")
 
 class Formats:
 
     pstoedit = "/usr/bin/pstoedit"
 
-    _BASE_FORMATS = ['svg', 'svg_Ponoko', 'ps']
+    _BASE_FORMATS = ['svg', 'svg_Ponoko', 'ps', 'dxf', 'gcode', 'plt']
 
     formats = {
         "svg": None,
         "svg_Ponoko": None,
         "ps": None,
-        "dxf": "-flat 0.1 -f dxf:-mm".split(),
-        "gcode": "-f gcode".split(),
-        "plt": "-f plot-hpgl".split(),
+        "dxf": None,
+        "gcode": None,
+        "plt": None,
         "ai": "-f ps2ai".split(),
         "pdf": "-f pdf".split(),
     }
 
+    # formats written directly from the recorded drawing
+    writers = {
+        "svg": SVGWriter,
+        "svg_Ponoko": PonokoSVGWriter,
+        "dxf": DXFWriter,
+        "gcode": GCodeWriter,
+        "plt": HPGLWriter,
+    }
+
     http_headers = {
         "svg": [('Content-type', 'image/svg+xml; charset=utf-8')],
         "svg_Ponoko": [('Content-type', 'image/svg+xml; charset=utf-8')],
@@ -78,33 +511,98 @@ class Formats:
         else:
             return self._BASE_FORMATS
 
-    def getSurface(self, fmt, filename):
+    def inMemory(self, fmt):
+        """Whether fmt can be rendered into a binary file object (like
+        io.BytesIO) instead of a file"""
+        return fmt in self._BASE_FORMATS
+
+    def getSurface(self, fmt, filename=None):
+        """Return an in memory surface and a context recording on it.
+        Nothing is written before .render() is called."""
+        surface = drawing.Surface()
+        return surface, drawing.Context(surface)
+
+    def _replay(self, surface, ctx):
+        """Draw the recorded paths onto a cairo context"""
+        cairo = _cairo()
+        for path in surface.paths:
+            ctx.set_source_rgb(*path.color)
+            ctx.set_line_width(path.width)
+            for c in path.commands:
+                if c[0] == "M":
+                    ctx.move_to(*c[1:])
+                elif c[0] == "L":
+                    ctx.line_to(*c[1:])
+                elif c[0] == "C":
+                    ctx.curve_to(*c[1:])
+                elif c[0] == "A":
+                    xc, yc, r, a1, a2 = c[1:]
+                    if a2 >= a1:
+                        ctx.arc(xc, yc, r, a1, a2)
+                    else:
+                        ctx.arc_negative(xc, yc, r, a1, a2)
+            ctx.stroke()
 
-        width = height = 10000  # mm
+        for text in surface.texts:
+            ctx.save()
+            ctx.set_source_rgb(*text.color)
+            ctx.translate(text.x, text.y)
+            ctx.transform(cairo.Matrix(*(tuple(text.matrix) + (0, 0))))
+            ctx.set_font_size(text.fontsize)
+            ctx.move_to(0, 0)
+            ctx.show_text(text.text)
+            ctx.restore()
 
-        if fmt in ("svg", "svg_Ponoko"):
-            surface = cairo.SVGSurface(filename, width, height)
-            mm2pt = 1.0
+    def render(self, surface, fmt, filename, metadata=None, **settings):
+        """Write the recorded surface to filename
+
+        filename can also be a binary file object if .inMemory(fmt).
+        Formats in .writers are written directly. For everything else
+        the drawing is replayed on a cairo surface that is only as big
+        as the drawing.
+
+        :param settings: attributes of the writer to set (e.g. feed, power, passes)
+        """
+        if fmt in self.writers:
+            writer = self.writers[fmt](filename)
+            for name, value in settings.items():
+                if value is not None and hasattr(writer, name):
+                    setattr(writer, name, value)
+            writer.write(surface, metadata)
+            return
+
+        cairo = _cairo()
+
+        extend = surface.extend
+        margin = 10.0 # mm
+        if extend:
+            minx, miny = extend.minx - margin, extend.miny - margin
+            width = math.ceil(extend.width + 2 * margin)
+            height = math.ceil(extend.height + 2 * margin)
         else:
-            mm2pt = 72 / 25.4
-            width *= mm2pt
-            height *= mm2pt  # 3.543307
-            surface = cairo.PSSurface(filename, width, height)
+            minx = miny = 0.0
+            width = height = 2 * margin
 
-        ctx = cairo.Context(surface)
-        ctx.translate(0, height)
-        ctx.scale(mm2pt, -mm2pt)
+        mm2pt = 72 / 25.4
+        out = cairo.PSSurface(filename, width * mm2pt, height * mm2pt)
 
-        return surface, ctx
+        ctx = cairo.Context(out)
+        ctx.translate(0, height * mm2pt)
+        ctx.scale(mm2pt, -mm2pt)
+        ctx.translate(-minx, -miny)
+        ctx.select_font_face("sans-serif")
+        self._replay(surface, ctx)
+        out.flush()
+        out.finish()
 
     def convert(self, filename, fmt, metadata=None):
 
-        if fmt in ['svg', 'svg_Ponoko']:
-            svg = svgutil.SVGFile(filename)
-            svg.fix(metadata)
-        else:
-            ps = PSFile(filename)
-            ps.adjustDocumentMedia()
+        if fmt in self.writers:
+            # already written in final form by .render()
+            return
+
+        ps = PSFile(filename)
+        ps.adjustDocumentMedia()
 
         if fmt not in self._BASE_FORMATS:
             fd, tmpfile = tempfile.mkstemp(dir=os.path.dirname(filename))
@@ -41,10 +41,10 @@ Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
 			Fixed https://github.com/jnweiger/inkscape-gears-dev
 '''
 
-from os import devnull # for debugging
 from math import pi, cos, sin, tan, radians, degrees, ceil, asin, acos, sqrt
 two_pi = 2 * pi
 import argparse
+import functools
 from boxes.vectors import kerf, vdiff, vlength
 
 __version__ = '0.9'
@@ -240,9 +240,77 @@ def generate_spur_points(teeth, base_radius, pitch_radius, outer_radius, root_ra
 
     return (points)
 
+@functools.lru_cache(maxsize=64)
+def spur_outline(teeth, base_radius, pitch_radius, outer_radius, root_radius,
+                 accuracy_involute, accuracy_circular, offset=0.0):
+    """ cached generate_spur_points() as tuple of points
+        - the params are derived from teeth, pitch, pressure angle,
+          clearance, profile shift, accuracy and ring gear style
+        - offset != 0 returns the outline with kerf(points, offset) applied
+    """
+    if offset:
+        points = spur_outline(teeth, base_radius, pitch_radius, outer_radius,
+                              root_radius, accuracy_involute,
+                              accuracy_circular)
+        return tuple(tuple(p) for p in kerf(points, offset))
+    return tuple(generate_spur_points(
+        teeth, base_radius, pitch_radius, outer_radius, root_radius,
+        accuracy_involute, accuracy_circular))
+
 def inkbool(val):
     return val not in ("False", False, "0", 0, "None", None)
 
+# (short, long, type, dest, default, help)
+OPTIONS = (
+    ("-t", "--teeth", "int", "teeth", 24,
+     "Number of teeth"),
+    ("-s", "--system", "string", "system", 'MM',
+     "Select system: 'CP' (Cyclic Pitch (default)), 'DP' (Diametral Pitch), 'MM' (Metric Module)"),
+    ("-d", "--dimension", "float", "dimension", 1.0,
+     "Tooth size, depending on system (which defaults to CP)"),
+    ("-a", "--angle", "float", "angle", 20.0,
+     "Pressure Angle (common values: 14.5, 20, 25 degrees)"),
+    ("-p", "--profile-shift", "float", "profile_shift", 20.0,
+     "Profile shift [in percent of the module]. Negative values help against undercut"),
+    ("-u", "--units", "string", "units", 'mm',
+     "Units this dialog is using"),
+    ("-A", "--accuracy", "int", "accuracy", 0,
+     "Accuracy of involute: automatic: 5..20 (default), best: 20(default), medium 10, low: 5; good acuracy is important with a low tooth count"),
+    # Clearance: Radial distance between top of tooth on one gear to bottom of gap on another.
+    ("", "--clearance", "float", "clearance", 0.0,
+     "Clearance between bottom of gap of this gear and top of tooth of another"),
+    ("", "--annotation", "inkbool", "annotation", False,
+     "Draw annotation text"),
+    ("-i", "--internal-ring", "inkbool", "internal_ring", False,
+     "Ring (or Internal) gear style (default: normal spur gear)"),
+    ("", "--mount-hole", "float", "mount_hole", 0.,
+     "Mount hole diameter"),
+    ("", "--mount-diameter", "float", "mount_diameter", 15,
+     "Mount support diameter"),
+    ("", "--spoke-count", "int", "spoke_count", 3,
+     "Spokes count"),
+    ("", "--spoke-width", "float", "spoke_width", 5,
+     "Spoke width"),
+    ("", "--holes-rounding", "float", "holes_rounding", 5,
+     "Holes rounding"),
+    ("", "--active-tab", "string", "active_tab", '',
+     "Active tab. Not used now."),
+    ("-x", "--centercross", "inkbool", "centercross", False,
+     "Draw cross in center"),
+    ("-c", "--pitchcircle", "inkbool", "pitchcircle", False,
+     "Draw pitch circle (for mating)"),
+    ("-r", "--draw-rack", "inkbool", "drawrack", False,
+     "Draw rack gear instead of spur gear"),
+    ("", "--rack-teeth-length", "int", "teeth_length", 12,
+     "Length (in teeth) of rack"),
+    ("", "--rack-base-height", "float", "base_height", 8,
+     "Height of base of rack"),
+    ("", "--rack-base-tab", "float", "base_tab", 14,
+     "Length of tabs on ends of rack"),
+    ("", "--undercut-alert", "inkbool", "undercut_alert", False,
+     "Let the user confirm a warning dialog if undercut occurs. This dialog also shows helpful hints against undercut"),
+)
+
 class OptionParser(argparse.ArgumentParser):
 
     types = {
@@ -252,6 +320,12 @@ class OptionParser(argparse.ArgumentParser):
         "inkbool" : inkbool,
         }
 
+    def __init__(self, *args, **kw):
+        super().__init__(*args, **kw)
+        for short, long_, type_, dest, default, help in OPTIONS:
+            self.add_option(short, long_, action="store", type=type_,
+                            dest=dest, default=default, help=help)
+
     def add_option(self, short, long_, **kw):
         kw["type"] = self.types[kw["type"]]
         names = []
@@ -261,134 +335,76 @@ class OptionParser(argparse.ArgumentParser):
             names.append("--" + long_.replace("-", "_")[2:])
         self.add_argument(*names, **kw)
 
+class GearOptions:
+    """Parameters of a gear
+
+    Values are converted to their types and checked on creation. Takes
+    the same names as the command line options (with "_" instead of
+    "-", e.g. draw_rack) or their attribute names (e.g. drawrack).
+    Instances can be passed to Gears() and Gears.sizes() directly.
+    """
+
+    _types = OptionParser.types
+    _dests = {}
+    _defaults = {}
+    for short, long_, type_, dest, default, help in OPTIONS:
+        _dests[dest] = (dest, type_)
+        _dests[long_[2:].replace("-", "_")] = (dest, type_)
+        _defaults[dest] = default
+    del short, long_, type_, dest, default, help
+
+    __slots__ = tuple(_defaults)
+
+    def __init__(self, **kw):
+        for name, value in self._defaults.items():
+            setattr(self, name, value)
+        self.update(**kw)
+
+    def update(self, **kw):
+        """Set the given parameters
+
+        :raises ValueError: for unknown parameters or invalid values
+        """
+        for name, value in kw.items():
+            if name not in self._dests:
+                raise ValueError("Unknown gear parameter: %s" % name)
+            dest, type_ = self._dests[name]
+            try:
+                value = self._types[type_](value)
+            except (TypeError, ValueError):
+                raise ValueError("Invalid %s value for gear parameter %s: %r" % (
+                    type_, name, value))
+            setattr(self, dest, value)
+        return self
+
+    def copy(self, **kw):
+        """Return a copy with the given parameters changed"""
+        result = GearOptions.__new__(GearOptions)
+        for name in self.__slots__:
+            setattr(result, name, getattr(self, name))
+        return result.update(**kw)
+
+    def __repr__(self):
+        return "GearOptions(%s)" % ", ".join(
+            "%s=%r" % (name, getattr(self, name)) for name in self.__slots__)
+
 class Gears():
 
     def __init__(self, boxes, **kw):
-        # an alternate way to get debug info:
-        # could use inkex.debug(string) instead...
-        try:
-            self.tty = open("/dev/tty", 'w')
-        except:
-            self.tty = open(devnull, 'w')  # '/dev/null' for POSIX, 'nul' for Windows.
-            # print >>self.tty, "gears-dev " + __version__
-
         self.boxes = boxes
-        self.OptionParser = OptionParser()
-        self.OptionParser.add_option("-t", "--teeth",
-                                     action="store", type="int",
-                                     dest="teeth", default=24,
-                                     help="Number of teeth")
-
-        self.OptionParser.add_option("-s", "--system",
-                                     action="store", type="string", 
-                                     dest="system", default='MM',
-                                     help="Select system: 'CP' (Cyclic Pitch (default)), 'DP' (Diametral Pitch), 'MM' (Metric Module)")
-
-        self.OptionParser.add_option("-d", "--dimension",
-                                     action="store", type="float",
-                                     dest="dimension", default=1.0,
-                                     help="Tooth size, depending on system (which defaults to CP)")
-
-
-        self.OptionParser.add_option("-a", "--angle",
-                                     action="store", type="float",
-                                     dest="angle", default=20.0,
-                                     help="Pressure Angle (common values: 14.5, 20, 25 degrees)")
-
-        self.OptionParser.add_option("-p", "--profile-shift",
-                                     action="store", type="float",
-                                     dest="profile_shift", default=20.0,
-                                     help="Profile shift [in percent of the module]. Negative values help against undercut")
-
-        self.OptionParser.add_option("-u", "--units",
-                                     action="store", type="string",
-                                     dest="units", default='mm',
-                                     help="Units this dialog is using")
-
-        self.OptionParser.add_option("-A", "--accuracy",
-                                     action="store", type="int",
-                                     dest="accuracy", default=0,
-                                     help="Accuracy of involute: automatic: 5..20 (default), best: 20(default), medium 10, low: 5; good acuracy is important with a low tooth count")
-        # Clearance: Radial distance between top of tooth on one gear to bottom of gap on another.
-        self.OptionParser.add_option("", "--clearance",
-                                     action="store", type="float",
-                                     dest="clearance", default=0.0,
-                                     help="Clearance between bottom of gap of this gear and top of tooth of another")
-
-        self.OptionParser.add_option("", "--annotation",
-                                     action="store", type="inkbool", 
-                                     dest="annotation", default=False,
-                                     help="Draw annotation text")
-
-        self.OptionParser.add_option("-i", "--internal-ring",
-                                     action="store", type="inkbool",
-                                     dest="internal_ring", default=False,
-                                     help="Ring (or Internal) gear style (default: normal spur gear)")
-
-        self.OptionParser.add_option("", "--mount-hole",
-                                     action="store", type="float",
-                                     dest="mount_hole", default=0.,
-                                     help="Mount hole diameter")
-
-        self.OptionParser.add_option("", "--mount-diameter",
-                                     action="store", type="float",
-                                     dest="mount_diameter", default=15,
-                                     help="Mount support diameter")
-
-        self.OptionParser.add_option("", "--spoke-count",
-                                     action="store", type="int",
-                                     dest="spoke_count", default=3,
-                                     help="Spokes count")
-
-        self.OptionParser.add_option("", "--spoke-width",
-                                     action="store", type="float",
-                                     dest="spoke_width", default=5,
-                                     help="Spoke width")
-
-        self.OptionParser.add_option("", "--holes-rounding",
-                                     action="store", type="float",
-                                     dest="holes_rounding", default=5,
-                                     help="Holes rounding")
-
-        self.OptionParser.add_option("", "--active-tab",
-                                     action="store", type="string",
-                                     dest="active_tab", default='',
-                                     help="Active tab. Not used now.")
-
-        self.OptionParser.add_option("-x", "--centercross",
-                                     action="store", type="inkbool", 
-                                     dest="centercross", default=False,
-                                     help="Draw cross in center")
-
-        self.OptionParser.add_option("-c", "--pitchcircle",
-                                     action="store", type="inkbool",
-                                     dest="pitchcircle", default=False,
-                                     help="Draw pitch circle (for mating)")
-
-        self.OptionParser.add_option("-r", "--draw-rack",
-                                     action="store", type="inkbool", 
-                                     dest="drawrack", default=False,
-                                     help="Draw rack gear instead of spur gear")
-
-        self.OptionParser.add_option("", "--rack-teeth-length",
-                                     action="store", type="int",
-                                     dest="teeth_length", default=12,
-                                     help="Length (in teeth) of rack")
-
-        self.OptionParser.add_option("", "--rack-base-height",
-                                     action="store", type="float",
-                                     dest="base_height", default=8,
-                                     help="Height of base of rack")
-
-        self.OptionParser.add_option("", "--rack-base-tab",
-                                     action="store", type="float",
-                                     dest="base_tab", default=14,
-                                     help="Length of tabs on ends of rack")
-
-        self.OptionParser.add_option("", "--undercut-alert",
-                                     action="store", type="inkbool", 
-                                     dest="undercut_alert", default=False,
-                                     help="Let the user confirm a warning dialog if undercut occurs. This dialog also shows helpful hints against undercut")
+        self.options = GearOptions()
+
+    @property
+    def OptionParser(self):
+        """argparse parser for the gear options (for command line use)"""
+        return OptionParser()
+
+    def _options(self, options, kw):
+        if options is None:
+            return GearOptions(**kw)
+        if kw:
+            return options.copy(**kw)
+        return options
 
     def drawPoints(self, lines, kerfdir=1, close=True):
 
@@ -511,8 +527,8 @@ class Gears():
 
         return messages
 
-    def sizes(self, **kw):
-        self.options = self.OptionParser.parse_args(["--%s=%s" % (name,value) for name, value in kw.items()])
+    def sizes(self, options=None, **kw):
+        self.options = self._options(options, kw)
         # Pitch (circular pitch): Length of the arc from one tooth to the next)
         # Pitch diameter: Diameter of pitch circle.
         pitch = self.calc_circular_pitch()
@@ -568,13 +584,15 @@ class Gears():
         self.boxes.ctx.restore()
         self.boxes.move(width, width, move)
 
-    def __call__(self, teeth_only=False, move="", callback=None, **kw):
+    def __call__(self, teeth_only=False, move="", callback=None, options=None, **kw):
         """ Calculate Gear factors from inputs.
             - Make list of radii, angles, and centers for each tooth and 
               iterate through them
             - Turn on other visual features e.g. cross, rack, annotations, etc
+            - options is a GearOptions instance, keyword arguments
+              override its values
         """
-        self.options = self.OptionParser.parse_args(["--%s=%s" % (name,value) for name, value in kw.items()])
+        self.options = self._options(options, kw)
 
         warnings = [] # list of extra messages to be shown in annotations
         # calculate unit factor for units defined in dialog. 
@@ -609,7 +627,6 @@ class Gears():
                 accuracy_involute = self.options.accuracy
 
             accuracy_circular = max(3, int(accuracy_involute/2) - 1) # never less than three
-        # print >>self.tty, "accuracy_circular=%s accuracy_involute=%s" % (accuracy_circular, accuracy_involute)
         # Pitch (circular pitch): Length of the arc from one tooth to the next)
         # Pitch diameter: Diameter of pitch circle.
         pitch = self.calc_circular_pitch()
@@ -661,12 +678,12 @@ class Gears():
             warnings.extend(msg.split("\n"))
 
         # All base calcs done. Start building gear
-        points = generate_spur_points(teeth, base_radius, pitch_radius, outer_radius, root_radius, accuracy_involute, accuracy_circular)
+        points = spur_outline(teeth, base_radius, pitch_radius, outer_radius, root_radius, accuracy_involute, accuracy_circular, self.boxes.burn)
 
         if not teeth_only:
             self.boxes.moveTo(width/2, height/2)
         self.boxes.cc(callback, None, 0, 0)
-        self.drawPoints(points)
+        self.drawPoints(points, kerfdir=0) # already done
         # Spokes
         if not teeth_only and not self.options.internal_ring:  # only draw internals if spur gear
             msg = self.generate_spokes(root_radius, spoke_width, spoke_count, mount_radius, mount_hole,
@@ -1,6 +1,8 @@
 import pkgutil
 import inspect
 import importlib
+import json
+import os
 import boxes
 
 ui_groups_by_name = {}
@@ -56,3 +58,87 @@ def getAllGeneratorModules():
         generators[modname.split('.')[-1]] = module
     return generators
 
+
+class GeneratorInfo:
+    """Entry of the generator index
+
+    Has the attributes of the generator class needed for listing and
+    grouping (__name__, __doc__, ui_group, webinterface) without
+    importing it. .load() imports the module and returns the class.
+    """
+
+    def __init__(self, name, module, ui_group="Misc", doc=None,
+                 webinterface=True):
+        self.__name__ = name
+        self.__doc__ = doc
+        self.module = module
+        self.ui_group = ui_group
+        self.webinterface = webinterface
+
+    def load(self):
+        return getattr(importlib.import_module(self.module), self.__name__)
+
+_index = None
+_indexfile = os.path.join(__path__[0], ".index.json")
+
+def _sourceFiles():
+    """Stat data of all files the index depends on"""
+    files = [boxes.__file__]
+    for path in __path__:
+        files.extend(os.path.join(path, fn) for fn in sorted(os.listdir(path))
+                     if fn.endswith(".py"))
+    result = {}
+    for fn in files:
+        st = os.stat(fn)
+        result[fn] = [st.st_size, st.st_mtime_ns]
+    return result
+
+def _buildIndex():
+    generators = {}
+    for name, box in getAllBoxGenerators().items():
+        generators[box.__name__] = [box.__module__, box.ui_group, box.__doc__,
+                                    box.webinterface]
+    return generators
+
+def getGeneratorIndex():
+    """Return dict of generator name -> GeneratorInfo
+
+    The index is kept in boxes/generators/.index.json. Generators are
+    only imported if it is missing or any of the source files changed.
+    """
+    global _index
+    if _index is not None:
+        return _index
+    files = _sourceFiles()
+    generators = None
+    try:
+        with open(_indexfile) as f:
+            data = json.load(f)
+        if data["files"] == files:
+            generators = data["generators"]
+    except (OSError, ValueError, KeyError):
+        pass
+    if generators is None:
+        generators = _buildIndex()
+        try:
+            with open(_indexfile, "w") as f:
+                json.dump({"files" : files, "generators" : generators}, f)
+        except OSError: # read only installation
+            pass
+    _index = {name : GeneratorInfo(name, *values)
+              for name, values in generators.items()}
+    return _index
+
+def getBoxGenerator(name):
+    """Return generator class by name (case insensitive), importing
+    only its module. None if there is no such generator."""
+    index = getGeneratorIndex()
+    info = index.get(name)
+    if info is None:
+        for n, i in index.items():
+            if n.lower() == name.lower():
+                info = i
+                break
+        else:
+            return None
+    return info.load()
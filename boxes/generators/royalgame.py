@@ -174,8 +174,9 @@ class RoyalGame(Boxes): # Change class name!
         self.rectangularWall(x, y, "fNff", callback=[self.top,], move="up")
 
         
-        self.partsMatrix(7, 7, "up", self.parts.disc, 0.8*size, callback=self.player1)
-        self.partsMatrix(7, 7, "up", self.parts.disc, 0.8*size, callback=self.player2)
+        disc = self.instanced(self.parts.disc)
+        self.partsMatrix(7, 7, "up", disc, 0.8*size, callback=self.player1)
+        self.partsMatrix(7, 7, "up", disc, 0.8*size, callback=self.player2)
 
         self.dice(size, 4, move="up")
         self.dice(size, 4, move="up")
@@ -0,0 +1,160 @@
+# Copyright (C) 2013-2020 Florian Festi
+#
+#   This program is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Pack the parts of a drawing onto sheets of material
+
+Boxes.move() marks the parts in the recorded drawing.Surface. Their
+bounding boxes are packed onto sheets with the MaxRects algorithm
+(best short side fit), optionally rotating them by 90 degrees. Each
+sheet becomes a new Surface.
+"""
+
+from boxes import drawing
+
+class Part:
+    """Paths and texts that are placed together"""
+
+    def __init__(self, paths, texts):
+        self.paths = paths
+        self.texts = texts
+        self.extend = drawing.Extend()
+        for p in paths:
+            self.extend.addExtend(p.extend)
+        for t in texts:
+            self.extend.addExtend(t.extend)
+
+def parts(surface):
+    """Split surface into Parts. Everything drawn between two parts
+    is treated as one part of its own."""
+    result = []
+    pos = tpos = 0
+    for p1, p2, t1, t2 in surface.parts + [(len(surface.paths), None,
+                                            len(surface.texts), None)]:
+        if p1 > pos or t1 > tpos:
+            result.append(Part(surface.paths[pos:p1], surface.texts[tpos:t1]))
+        if p2 is None:
+            break
+        result.append(Part(surface.paths[p1:p2], surface.texts[t1:t2]))
+        pos, tpos = p2, t2
+    return [p for p in result if p.extend]
+
+class Sheet:
+    """Free space of a sheet as list of maximal free rectangles"""
+
+    def __init__(self, width, height):
+        self.width = width
+        self.height = height
+        self.free = [(0.0, 0.0, width, height)]
+        self.placements = []
+
+    def find(self, w, h, rotate=True):
+        """Return (score, x, y, rotated) of the best position or None"""
+        best = None
+        for x, y, fw, fh in self.free:
+            for rotated, (pw, ph) in ((False, (w, h)), (True, (h, w))):
+                if rotated and not rotate:
+                    continue
+                if pw <= fw + 1E-9 and ph <= fh + 1E-9:
+                    score = (min(fw - pw, fh - ph), max(fw - pw, fh - ph))
+                    if best is None or score < best[0]:
+                        best = (score, x, y, rotated)
+        return best
+
+    def place(self, x, y, w, h):
+        free = []
+        for fx, fy, fw, fh in self.free:
+            if (x >= fx + fw - 1E-9 or x + w <= fx + 1E-9 or
+                y >= fy + fh - 1E-9 or y + h <= fy + 1E-9):
+                free.append((fx, fy, fw, fh))
+                continue
+            # split into the (up to 4) maximal rectangles around
+            if x > fx:
+                free.append((fx, fy, x - fx, fh))
+            if x + w < fx + fw:
+                free.append((x + w, fy, fx + fw - x - w, fh))
+            if y > fy:
+                free.append((fx, fy, fw, y - fy))
+            if y + h < fy + fh:
+                free.append((fx, y + h, fw, fy + fh - y - h))
+        # remove rectangles contained in others
+        self.free = [r for i, r in enumerate(free) if not any(
+            i != j and r[0] >= o[0] - 1E-9 and r[1] >= o[1] - 1E-9 and
+            r[0] + r[2] <= o[0] + o[2] + 1E-9 and
+            r[1] + r[3] <= o[1] + o[3] + 1E-9 and (r != o or j < i)
+            for j, o in enumerate(free))]
+
+def pack(sizes, width, height, rotate=True):
+    """Pack rectangles onto as few sheets as possible
+
+    :param sizes: list of (width, height)
+    :param rotate: (Default value = True) allow turning by 90 degrees
+    :return: list of (sheet number, x, y, rotated) in the order of sizes
+    """
+    result = [None] * len(sizes)
+    sheets = []
+    order = sorted(range(len(sizes)),
+                   key=lambda i: (-max(sizes[i]), -min(sizes[i])))
+    for i in order:
+        w, h = sizes[i]
+        if ((w > width + 1E-9 or h > height + 1E-9) and
+            (not rotate or h > width + 1E-9 or w > height + 1E-9)):
+            raise ValueError(
+                "Part of size %.1fmm x %.1fmm does not fit on the sheet" % (
+                    w, h))
+        for nr, sheet in enumerate(sheets):
+            pos = sheet.find(w, h, rotate)
+            if pos:
+                break
+        else:
+            sheets.append(Sheet(width, height))
+            nr, sheet = len(sheets) - 1, sheets[-1]
+            pos = sheet.find(w, h, rotate)
+        score, x, y, rotated = pos
+        if rotated:
+            sheet.place(x, y, h, w)
+        else:
+            sheet.place(x, y, w, h)
+        result[i] = (nr, x, y, rotated)
+    return result
+
+def nest(surface, width, height, spacing=0.0, rotate=True):
+    """Distribute the parts of surface onto sheets of the given size
+
+    :param width: width of the sheets in mm
+    :param height: height of the sheets in mm
+    :param spacing: (Default value = 0.0) gap between the parts in mm
+    :param rotate: (Default value = True) allow turning parts by 90 degrees
+    :return: list of drawing.Surface - one per sheet
+    """
+    ps = parts(surface)
+    # the spacing after the last part in a row may stick out
+    sizes = [(p.extend.width + spacing, p.extend.height + spacing)
+             for p in ps]
+    positions = pack(sizes, width + spacing, height + spacing, rotate)
+    sheets = [drawing.Surface()
+              for i in range(max((p[0] for p in positions), default=-1) + 1)]
+    for part, (nr, x, y, rotated) in zip(ps, positions):
+        e = part.extend
+        if rotated: # 90 degrees counter clockwise
+            m = (0.0, 1.0, -1.0, 0.0, x + e.maxy, y - e.minx)
+        else:
+            m = (1.0, 0.0, 0.0, 1.0, x - e.minx, y - e.miny)
+        sheets[nr].beginPart()
+        for path in part.paths:
+            sheets[nr].addPath(path.transformed(m))
+        for text in part.texts:
+            sheets[nr].addText(text.transformed(m))
+        sheets[nr].endPart()
+    return sheets
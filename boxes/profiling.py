@@ -0,0 +1,139 @@
+# Copyright (C) 2013-2020 Florian Festi
+#
+#   This program is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Timing and counters for a single rendering
+
+Set Boxes.renderProfile to a Profile before calling .parseArgs() to get the
+time spent in the phases of rendering and the number of primitives
+drawn. Without it nothing is measured.
+"""
+
+import time
+from contextlib import contextmanager
+from functools import wraps
+
+# counter name -> Boxes methods counted
+PRIMITIVES = {
+    "edge" : ("edge",),
+    "corner" : ("corner",),
+    "curve" : ("curveTo",),
+    "hole" : ("hole", "rectangularHole", "dHole", "flatHole",
+              "regularPolygonHole", "mountingHole", "holeField",
+              "fingerHolesAt"),
+    "text" : ("text",),
+}
+
+def serverTiming(phases):
+    """Value of a Server-Timing HTTP header for a dict of phase times"""
+    return ", ".join("%s;dur=%.1f" % (name, seconds * 1000)
+                     for name, seconds in phases.items())
+
+class Profile:
+    """Phase timers and counters of one rendering
+
+    profiler can be a cProfile.Profile or any other object with
+    either .enable()/.disable() or .start()/.stop() - like most sampling
+    profilers. It runs from the first phase until .finish() (called
+    at the end of Boxes.close()). With count=False only the phases
+    are timed.
+    """
+
+    def __init__(self, profiler=None, count=True):
+        self.profiler = profiler
+        self.countPrimitives = count
+        self.running = False
+        self.phases = {} # name -> seconds, in the order the phases started
+        self.depth = {} # name -> number of enclosing phases
+        self.counters = {}
+        self._stack = []
+
+    def _startProfiler(self):
+        if self.running or self.profiler is None:
+            return
+        self.running = True
+        if hasattr(self.profiler, "enable"):
+            self.profiler.enable()
+        else:
+            self.profiler.start()
+
+    def _stopProfiler(self):
+        if not self.running:
+            return
+        self.running = False
+        if hasattr(self.profiler, "disable"):
+            self.profiler.disable()
+        else:
+            self.profiler.stop()
+
+    @contextmanager
+    def phase(self, name):
+        """Context manager adding the time spent to phase name"""
+        self._startProfiler()
+        self.phases.setdefault(name, 0.0)
+        self.depth.setdefault(name, len(self._stack))
+        self._stack.append(name)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._stack.pop()
+            self.add(name, time.perf_counter() - start)
+
+    def add(self, name, seconds):
+        self.phases[name] = self.phases.get(name, 0.0) + seconds
+        self.depth.setdefault(name, len(self._stack))
+
+    def count(self, name, n=1):
+        self.counters[name] = self.counters.get(name, 0) + n
+
+    def finish(self):
+        """Stop the profiler"""
+        self._stopProfiler()
+
+    def attach(self, box):
+        """Count the primitives drawn by box (see PRIMITIVES). Call after
+        box._buildObjects() as some are parts created there."""
+        if not self.countPrimitives:
+            return
+        for counter, methods in PRIMITIVES.items():
+            for name in methods:
+                method = getattr(box, name, None)
+                if method is not None:
+                    setattr(box, name, self._counted(counter, method))
+
+    def _counted(self, counter, method):
+        @wraps(method)
+        def f(*args, **kw):
+            self.count(counter)
+            return method(*args, **kw)
+        return f
+
+    def asDict(self):
+        return {"phases" : dict(self.phases),
+                "counters" : dict(self.counters)}
+
+    def serverTiming(self):
+        """Value of a Server-Timing HTTP header"""
+        return serverTiming(self.phases)
+
+    def report(self):
+        """Human readable summary"""
+        lines = ["%-16s %9.2fms" % ("  " * self.depth[name] + name,
+                                    seconds * 1000)
+                 for name, seconds in self.phases.items()]
+        if self.counters:
+            lines.append(" ".join("%s=%i" % item
+                                  for item in sorted(self.counters.items())))
+        return "\n".join(lines)
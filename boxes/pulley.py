@@ -12,8 +12,14 @@
 // pulley diameter checked and modelled from data at http://www.sdp-si.com/D265/HTML/D265T016.html
 """
 from math import *
+import functools
 from boxes.vectors import *
 
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
 
 def tooth_spaceing_curvefit(teeth, b, c, d):
     return ((c * teeth ** d) / (b + teeth ** d)) * teeth
@@ -26,6 +32,43 @@ def tooth_spacing(teeth, tooth_pitch, pitch_line_offset):
 def mirrorx(points):
     return [[-x, y] for x, y in points]
 
+def rotatedCopies(points, matrices):
+    """Transform points with each of the 2x3 matrices and concatenate
+    the results. Done for all copies at once if NumPy is available.
+    """
+    if numpy is None:
+        result = []
+        for m in matrices:
+            result.extend(vtransl(pt, m) for pt in points)
+        return result
+    p = numpy.asarray(points, dtype=float)
+    m = numpy.asarray(matrices, dtype=float)
+    x, y = p[:, 0], p[:, 1]
+    result = numpy.empty((len(m), len(p), 2))
+    result[:, :, 0] = (m[:, 0, 0, None] * x + m[:, 0, 1, None] * y) + m[:, 0, 2, None]
+    result[:, :, 1] = (m[:, 1, 0, None] * x + m[:, 1, 1, None] * y) + m[:, 1, 2, None]
+    return result.reshape((-1, 2))
+
+@functools.lru_cache(maxsize=64)
+def outline(profile, teeth, insideout=False, burn=0.0):
+    """ cached outline of a pulley as tuple of points around (0, 0)
+        - burn is the kerf to apply, the burn setting of the Boxes
+          instance is not used
+    """
+    pulley_OD, tooth_distance_from_centre, tooth_width_scale, \
+        tooth_depth_scale = Pulley.geometry(teeth, profile, insideout)
+
+    m = [[tooth_width_scale, 0, 0],
+         [0, tooth_depth_scale, -tooth_distance_from_centre]]
+    matrices = [mmul(m, rotm(i * 2 * pi / teeth)) for i in range(teeth)]
+    points = rotatedCopies(Pulley.teeth[profile][1:-1], matrices)
+
+    if burn:
+        points = kerf(points, -burn if insideout else burn)
+    if numpy is not None:
+        points = points.tolist()
+    return tuple(tuple(p) for p in points)
+
 class Pulley:
 
     spacing = {
@@ -97,15 +140,17 @@ class Pulley:
         self.boxes.ctx.line_to(*lines[0])
         self.boxes.ctx.restore()
 
-    def diameter(self, teeth, profile):
-        if self.spacing[profile][0]:
-            return tooth_spaceing_curvefit(teeth, *self.spacing[profile][1:])
+    @classmethod
+    def diameter(cls, teeth, profile):
+        if cls.spacing[profile][0]:
+            return tooth_spaceing_curvefit(teeth, *cls.spacing[profile][1:])
 
-        return tooth_spacing(teeth, *self.spacing[profile][1:])
-
-    def __call__(self, teeth, profile, insideout=False, r_axle=None,
-                 callback=None, move=""):
+        return tooth_spacing(teeth, *cls.spacing[profile][1:])
 
+    @classmethod
+    def geometry(cls, teeth, profile, insideout=False):
+        """Return outer diameter, distance of the teeth from the center
+        and the width and depth scale factors of the teeth"""
         # ********************************
         # ** Scaling tooth for good fit **
         # ********************************
@@ -116,9 +161,9 @@ class Pulley:
         # If you need more tooth depth than this provides, adjust the following constant. However, this will cause the shape of the tooth to change.
         additional_tooth_depth = 0  # mm
 
-        pulley_OD = self.diameter(teeth, profile)
+        pulley_OD = cls.diameter(teeth, profile)
 
-        tooth_depth, tooth_width = self.profile_data[profile]
+        tooth_depth, tooth_width = cls.profile_data[profile]
         tooth_distance_from_centre = ((pulley_OD / 2) ** 2 - ((tooth_width + additional_tooth_width) / 2) ** 2) ** 0.5
         tooth_width_scale = (tooth_width + additional_tooth_width) / tooth_width
         tooth_depth_scale = ((tooth_depth + additional_tooth_depth) / tooth_depth)
@@ -127,6 +172,25 @@ class Pulley:
             pulley_OD += 2*tooth_depth * tooth_depth_scale
             tooth_depth_scale *= -1
 
+        return (pulley_OD, tooth_distance_from_centre,
+                tooth_width_scale, tooth_depth_scale)
+
+    def points(self, teeth, profile, insideout=False, burn=None):
+        """Outline of the pulley as tuple of points around (0, 0)
+
+        :param teeth: number of teeth
+        :param profile: belt profile - see getProfiles()
+        :param insideout: (Default value = False) outline of a belt around the pulley instead
+        :param burn: (Default value = None) kerf to apply, None for the burn setting
+        """
+        if burn is None:
+            burn = self.boxes.burn
+        return outline(profile, teeth, insideout, burn)
+
+    def __call__(self, teeth, profile, insideout=False, r_axle=None,
+                 callback=None, move=""):
+
+        pulley_OD = self.geometry(teeth, profile, insideout)[0]
         total_width = max(pulley_OD, 2*(r_axle or 0.0))
 
         if self.boxes.move(total_width, total_width, move, before=True):
@@ -141,12 +205,5 @@ class Pulley:
             else:
                 self.boxes.hole(0, 0, r_axle)
 
-        points = []
-        for i in range(teeth):
-            m = [[tooth_width_scale, 0, 0],
-                 [0, tooth_depth_scale, -tooth_distance_from_centre]]
-            m = mmul(m, rotm(i * 2 * pi / teeth))
-            points.extend((vtransl(pt, m) for pt in self.teeth[profile][1:-1]))
-
-        self.drawPoints(points, kerfdir=-1 if insideout else 1)
+        self.drawPoints(self.points(teeth, profile, insideout), kerfdir=0)
         self.boxes.move(total_width, total_width, move)
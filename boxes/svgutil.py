@@ -201,19 +201,23 @@ class SVGFile(object):
         return number
 
     def addMetadata(self, md):
-        txt = """
+        m = ElementTree.Comment(metadataText(md))
+        self.tree.getroot().insert(0, m)
+
+def metadataText(md):
+    """Text of the comment describing how the file was created"""
+    txt = """
 {name} - {description}
 Created with Boxes.py (https://festi.info/boxes.py)
 Creation date: {date}
 """.format(date=datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S") , **md)
 
-        txt += "Command line (remove spaces beteen dashes): %s\n" % md["cli"].replace("--", "- -")
+    txt += "Command line (remove spaces beteen dashes): %s\n" % md["cli"].replace("--", "- -")
 
-        if md["url"]:
-            txt+= "Url: %s\n" % md["url"]
-            txt+= "SettingsUrl: %s\n" % re.sub(r"&render=[01]", "", md["url"])
-        m = ElementTree.Comment(txt)
-        self.tree.getroot().insert(0, m)
+    if md["url"]:
+        txt+= "Url: %s\n" % md["url"]
+        txt+= "SettingsUrl: %s\n" % re.sub(r"&render=[01]", "", md["url"])
+    return txt
 
 unit2mm = {"mm" : 1.0,
            "cm" : 10.0,
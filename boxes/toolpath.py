@@ -0,0 +1,343 @@
+# Copyright (C) 2013-2020 Florian Festi
+#
+#   This program is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Tool paths for machine formats (gcode, plt)
+
+The recorded drawing is split into contours (polylines without moves).
+They are then ordered to keep the travel short: contours inside of
+other contours are cut first so parts don't drop out before their
+holes are done, then nearest neighbour plus 2-opt.
+"""
+
+import math
+from boxes import drawing
+
+def dist(p1, p2):
+    return ((p1[0] - p2[0]) ** 2 + (p1[1] - p2[1]) ** 2) ** 0.5
+
+class Contour:
+    """Connected polyline of one color"""
+
+    def __init__(self, points, color):
+        self.points = points
+        self.color = color
+        self.closed = dist(points[0], points[-1]) < 1E-6
+        self.extend = drawing.Extend()
+        for x, y in points:
+            self.extend.addPoint(x, y)
+        self.parent = None
+
+    @property
+    def start(self):
+        return self.points[0]
+
+    @property
+    def end(self):
+        return self.points[-1]
+
+    def length(self):
+        return sum(dist(p1, p2) for p1, p2 in zip(self.points, self.points[1:]))
+
+    def reverse(self):
+        self.points.reverse()
+
+    def startAt(self, pt):
+        """Choose start (and for closed contours end) point closest to pt"""
+        if self.closed:
+            i = min(range(len(self.points) - 1),
+                    key=lambda i: dist(self.points[i], pt))
+            self.points = self.points[i:-1] + self.points[:i+1]
+        elif dist(self.end, pt) < dist(self.start, pt):
+            self.reverse()
+
+    def contains(self, pt):
+        """Point in polygon (even odd rule)"""
+        x, y = pt
+        e = self.extend
+        if not (e.minx <= x <= e.maxx and e.miny <= y <= e.maxy):
+            return False
+        inside = False
+        for (x1, y1), (x2, y2) in zip(self.points, self.points[1:]):
+            if (y1 > y) != (y2 > y) and x < x1 + (y - y1) * (x2 - x1) / (y2 - y1):
+                inside = not inside
+        return inside
+
+def arcPoints(xc, yc, r, a1, a2, tolerance=0.05):
+    """Flatten an arc into points (without the start point)"""
+    if r > tolerance:
+        step = 2 * math.acos(1 - tolerance / r)
+    else:
+        step = math.pi / 2
+    n = max(1, int(math.ceil(abs(a2 - a1) / step)))
+    return [(xc + r * math.cos(a1 + (a2 - a1) * i / n),
+             yc + r * math.sin(a1 + (a2 - a1) * i / n))
+            for i in range(1, n + 1)]
+
+def contours(surface, tolerance=0.05, skip_colors=((1.0, 1.0, 1.0),)):
+    """Split the paths of a drawing.Surface into Contours
+
+    :param tolerance: (Default value = 0.05) maximal deviation of flattened curves in mm
+    :param skip_colors: colors that are not meant to be cut (white)
+    """
+    return pathContours(surface.paths, tolerance, skip_colors)
+
+def pathContours(paths, tolerance=0.05, skip_colors=((1.0, 1.0, 1.0),)):
+    """Split a list of drawing.Paths into Contours - see contours()"""
+    result = []
+    for path in paths:
+        if tuple(path.color) in skip_colors:
+            continue
+        points = []
+        for c in path.commands:
+            cmd = c[0]
+            if cmd == "M":
+                if points and dist(points[-1], c[1:3]) < 1E-6:
+                    continue
+                if len(points) > 1:
+                    result.append(Contour(points, path.color))
+                points = [c[1:3]]
+            elif cmd == "L":
+                if dist(points[-1], c[1:3]) > 1E-6:
+                    points.append(c[1:3])
+            elif cmd == "C":
+                points.extend(drawing.bezierPoints(
+                    *(tuple(points[-1]) + c[1:]), tolerance=tolerance))
+            elif cmd == "A":
+                points.extend(arcPoints(*c[1:], tolerance=tolerance))
+        if len(points) > 1:
+            result.append(Contour(points, path.color))
+    return result
+
+class _Grid:
+    """Buckets for finding contours near a point"""
+
+    def __init__(self, size=20.0):
+        self.size = size
+        self.cells = {}
+        self.items = 0
+
+    def _key(self, pt):
+        return (int(math.floor(pt[0] / self.size)),
+                int(math.floor(pt[1] / self.size)))
+
+    def add(self, pt, item):
+        self.cells.setdefault(self._key(pt), []).append(item)
+        self.items += 1
+
+    def addExtend(self, extend, item):
+        x1, y1 = self._key((extend.minx, extend.miny))
+        x2, y2 = self._key((extend.maxx, extend.maxy))
+        for x in range(x1, x2 + 1):
+            for y in range(y1, y2 + 1):
+                self.cells.setdefault((x, y), []).append(item)
+        self.items += 1
+
+    def at(self, pt):
+        return self.cells.get(self._key(pt), [])
+
+    def remove(self, pt, item):
+        self.cells[self._key(pt)].remove(item)
+        self.items -= 1
+
+    def removeExtend(self, extend, item):
+        x1, y1 = self._key((extend.minx, extend.miny))
+        x2, y2 = self._key((extend.maxx, extend.maxy))
+        for x in range(x1, x2 + 1):
+            for y in range(y1, y2 + 1):
+                self.cells[(x, y)].remove(item)
+        self.items -= 1
+
+    def nearest(self, pt, key):
+        """Return item closest to pt - key(item) gives the distance"""
+        if not self.items:
+            return None
+        cx, cy = self._key(pt)
+        best, bestd = None, None
+        ring = 0
+        while True:
+            for x in range(cx - ring, cx + ring + 1):
+                for y in range(cy - ring, cy + ring + 1):
+                    if max(abs(x - cx), abs(y - cy)) != ring:
+                        continue
+                    for item in self.cells.get((x, y), ()):
+                        d = key(item)
+                        if bestd is None or d < bestd:
+                            best, bestd = item, d
+            # items further out are at least (ring * size) away
+            if best is not None and bestd <= ring * self.size:
+                return best
+            ring += 1
+
+def nest(contours):
+    """Set .parent of each contour to the smallest closed contour around it"""
+    grid = _Grid()
+    for c in contours:
+        if c.closed:
+            grid.addExtend(c.extend, c)
+    for c in contours:
+        area = None
+        for o in grid.at(c.start):
+            if o is c:
+                continue
+            e, oe = c.extend, o.extend
+            if not (oe.minx <= e.minx and e.maxx <= oe.maxx and
+                    oe.miny <= e.miny and e.maxy <= oe.maxy):
+                continue
+            a = oe.width * oe.height
+            if a <= e.width * e.height or (area is not None and a >= area):
+                continue
+            # test a point not on a shared border
+            if o.contains(c.start) or o.contains(c.points[len(c.points)//2]):
+                c.parent, area = o, a
+
+def travel(contours, start=(0.0, 0.0)):
+    """Length of the moves between the contours in the given order"""
+    result = 0.0
+    pos = start
+    for c in contours:
+        result += dist(pos, c.start)
+        pos = c.end
+    return result
+
+def order(contours, start=(0.0, 0.0), max2opt=300):
+    """Order contours for short travel. Inner contours come first.
+
+    Greedy nearest neighbour among the contours that have nothing
+    left to cut inside of them, followed by 2-opt for up to max2opt
+    contours.
+
+    :param contours: list of Contours - will be modified
+    :param start: (Default value = (0.0, 0.0)) start position of the tool
+    :param max2opt: (Default value = 300) max number of contours to run 2-opt on
+    """
+    nest(contours)
+    children = {id(c): 0 for c in contours}
+    for c in contours:
+        if c.parent is not None:
+            children[id(c.parent)] += 1
+
+    grid = _Grid()
+    def add(c):
+        if c.closed:
+            grid.addExtend(c.extend, c)
+        else:
+            grid.add(c.start, c)
+            grid.add(c.end, c)
+    def remove(c):
+        if c.closed:
+            grid.removeExtend(c.extend, c)
+        else:
+            grid.remove(c.start, c)
+            grid.remove(c.end, c)
+    def distance(c):
+        if c.closed:
+            # distance to the bounding box - start point is chosen later
+            e = c.extend
+            dx = max(e.minx - pos[0], 0, pos[0] - e.maxx)
+            dy = max(e.miny - pos[1], 0, pos[1] - e.maxy)
+            return (dx * dx + dy * dy) ** 0.5
+        return min(dist(pos, c.start), dist(pos, c.end))
+
+    for c in contours:
+        if not children[id(c)]:
+            add(c)
+
+    result = []
+    pos = start
+    while len(result) < len(contours):
+        c = grid.nearest(pos, distance)
+        remove(c)
+        c.startAt(pos)
+        result.append(c)
+        pos = c.end
+        if c.parent is not None:
+            children[id(c.parent)] -= 1
+            if not children[id(c.parent)]:
+                add(c.parent)
+
+    if len(result) <= max2opt:
+        _twoOpt(result, start)
+    contours[:] = result
+    return contours
+
+def toolpaths(surface, tolerance=0.05, skip_colors=((1.0, 1.0, 1.0),)):
+    """Return the contours of a drawing.Surface in cutting order
+    grouped by color as list of (color, contours). Coordinates are
+    relative to the lower left corner of the drawing. Non black colors
+    (marks, engravings) come first.
+
+    :param tolerance: (Default value = 0.05) maximal deviation of flattened curves in mm
+    :param skip_colors: colors that are not meant to be cut (white)
+    """
+    extend = surface.extend
+    ox, oy = (extend.minx, extend.miny) if extend else (0.0, 0.0)
+    groups = {}
+    for c in contours(surface, tolerance, skip_colors):
+        c.points = [(x - ox, y - oy) for x, y in c.points]
+        c.extend = drawing.Extend()
+        for x, y in c.points:
+            c.extend.addPoint(x, y)
+        groups.setdefault(tuple(c.color), []).append(c)
+    result = []
+    pos = (0.0, 0.0)
+    for color in sorted(groups, key=lambda c: (c == (0.0, 0.0, 0.0), c)):
+        ordered = order(groups[color], pos)
+        pos = ordered[-1].end
+        result.append((color, ordered))
+    return result
+
+def passPoints(contour, passes=1):
+    """Points to visit for one contour including all passes.
+    Closed contours are repeated without lifting the tool. Open
+    contours are cut back and forth."""
+    points = list(contour.points)
+    for i in range(1, int(passes)):
+        if contour.closed:
+            points.extend(contour.points[1:])
+        else:
+            points.extend(points[-2::-1][:len(contour.points)-1])
+    return points
+
+def _twoOpt(tour, start, passes=10):
+    """Improve the order by reversing sub sequences. Keeps holes first."""
+    n = len(tour)
+    for p in range(passes):
+        changed = False
+        for i in range(-1, n - 2):
+            e_i = tour[i].end if i >= 0 else start
+            for j in range(i + 2, n):
+                s_i1 = tour[i+1].start
+                e_j = tour[j].end
+                old = dist(e_i, s_i1)
+                new = dist(e_i, e_j)
+                if j + 1 < n:
+                    s_j1 = tour[j+1].start
+                    old += dist(e_j, s_j1)
+                    new += dist(s_i1, s_j1)
+                if new >= old - 1E-9:
+                    continue
+                block = tour[i+1:j+1]
+                ids = set(id(c) for c in block)
+                if any(c.parent is not None and id(c.parent) in ids
+                       for c in block):
+                    continue # would cut a part before its holes
+                block.reverse()
+                for c in block:
+                    if not c.closed:
+                        c.reverse()
+                tour[i+1:j+1] = block
+                changed = True
+        if not changed:
+            break
@@ -14,6 +14,11 @@
 #   along with this program.  If not, see <http://www.gnu.org/licenses/>.
 import math
 
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
 
 def normalize(v):
     "set lenght of vector to one"
@@ -94,8 +99,18 @@ def mmul(m0, m1):
 
 def kerf(points, k, closed=True):
     """Outset points by k
-    Assumes a closed loop of points
+    Assumes a closed loop of points unless closed is False
+
+    Uses kerfArray() if NumPy is available and there are enough points
+    for it to pay off. Returns a NumPy array if points is one.
     """
+    if numpy is not None and (len(points) >= 16 or
+                              isinstance(points, numpy.ndarray)):
+        result = kerfArray(points, k, closed)
+        if isinstance(points, numpy.ndarray):
+            return result
+        return result.tolist()
+
     result = []
     lp = len(points)
 
@@ -116,3 +131,30 @@ def kerf(points, k, closed=True):
         result.append(vadd(points[i], vscalmul(d, -k / cos_alpha)))
 
     return result
+
+def _normalizeArray(v):
+    l = numpy.hypot(v[:, 0], v[:, 1])
+    l[l == 0.0] = 1.0 # zero vectors stay zero
+    return v / l[:, None]
+
+def kerfArray(points, k, closed=True):
+    """Outset points by k - same as kerf() but for all points at once.
+    Needs NumPy. Takes a sequence of points or an (n, 2) array and
+    returns an (n, 2) array.
+    """
+    p = numpy.asarray(points, dtype=float)
+    if not len(p):
+        return p.reshape((0, 2))
+    # normalized orthogonals of the segments before and after each point
+    v1 = _normalizeArray(p - numpy.roll(p, 1, axis=0))[:, ::-1] * (-1.0, 1.0)
+    v2 = numpy.roll(v1, -1, axis=0)
+    if not closed:
+        v1[0] = v2[0]
+        v2[-1] = v1[-1]
+    # direction the points have to move
+    d = _normalizeArray(v1 + v2)
+    # cos of the half the angle between the segments
+    cos_alpha = (v1 * d).sum(axis=1)
+    if not cos_alpha.all():
+        raise ZeroDivisionError("float division by zero")
+    return p + d * (-k / cos_alpha)[:, None]
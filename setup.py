@@ -80,6 +80,7 @@ setup(
     url='https://github.com/florianfesti/boxes',
     packages=find_packages(),
     install_requires=['cairocffi==0.8.0', 'markdown'],
+    extras_require={'fast': ['numpy']},
     scripts=['scripts/boxes', 'scripts/boxesserver'],
     cmdclass={
         'build_py': CustomBuildExtCommand,
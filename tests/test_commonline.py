@@ -0,0 +1,25 @@
+import pytest
+
+from boxes import commonline
+from boxes import drawing
+from boxes.generators.closedbox import ClosedBox
+
+def cutlength(*args):
+    box = ClosedBox()
+    box.parseArgs(["--burn=0.1"] + list(args))
+    return box.dryRun()["cutlength"]
+
+def test_nested_commonline_shares_edges():
+    plain = cutlength("--sheet=1000x1000")
+    merged = cutlength("--sheet=1000x1000", "--commonline=1")
+    assert merged < plain - 100
+
+def test_merge_touching_rectangles():
+    surface = drawing.Surface()
+    ctx = drawing.Context(surface)
+    ctx.rectangle(0, 0, 10, 10)
+    ctx.stroke()
+    ctx.rectangle(10, 0, 10, 10)
+    ctx.stroke()
+    assert commonline.mergeLines(surface) == pytest.approx(10)
+    assert sum(p.length() for p in surface.paths) == pytest.approx(70)
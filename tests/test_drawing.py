@@ -0,0 +1,76 @@
+import math
+
+import pytest
+
+from boxes import drawing
+
+def record(draw):
+    surface = drawing.Surface()
+    ctx = drawing.Context(surface)
+    draw(ctx)
+    ctx.stroke()
+    return surface
+
+def test_transformed_line():
+    def draw(ctx):
+        ctx.translate(10, 20)
+        ctx.rotate(math.pi / 2)
+        ctx.move_to(0, 0)
+        ctx.line_to(5, 0)
+    path, = record(draw).paths
+    (m, x0, y0), (l, x1, y1) = path.commands
+    assert (m, l) == ("M", "L")
+    assert (x0, y0) == pytest.approx((10, 20))
+    assert (x1, y1) == pytest.approx((10, 25))
+
+def test_save_restore():
+    def draw(ctx):
+        ctx.save()
+        ctx.translate(100, 0)
+        ctx.restore()
+        ctx.move_to(0, 0)
+        ctx.line_to(1, 1)
+    path, = record(draw).paths
+    assert path.commands[-1][1:] == pytest.approx((1, 1))
+
+def test_arc():
+    def draw(ctx):
+        ctx.translate(10, 20)
+        ctx.move_to(5, 0)
+        ctx.arc(0, 0, 5, 0, math.pi / 2)
+    surface = record(draw)
+    path, = surface.paths
+    assert path.commands[-1][0] == "A"
+    assert path.commands[-1][1:] == pytest.approx((10, 20, 5, 0, math.pi / 2))
+    e = surface.extend
+    assert (e.minx, e.miny, e.maxx, e.maxy) == pytest.approx((10, 20, 15, 25))
+
+def test_mirrored_arc():
+    def draw(ctx):
+        ctx.scale(-1, 1)
+        ctx.move_to(5, 0)
+        ctx.arc(0, 0, 5, 0, math.pi / 2)
+    path, = record(draw).paths
+    c = path.commands[-1]
+    assert c[0] == "A" and c[3] == pytest.approx(5)
+    # ends where cairo would: (0, 5) mirrored
+    assert list(path.points())[-1] == pytest.approx((0, 5))
+    assert c[1:3] == pytest.approx((0, 0))
+    assert c[5] < c[4] # now clockwise
+
+def test_distorted_arc_becomes_curves():
+    def draw(ctx):
+        ctx.scale(2, 1)
+        ctx.move_to(5, 0)
+        ctx.arc(0, 0, 5, 0, math.pi)
+    path, = record(draw).paths
+    assert [c[0] for c in path.commands] == ["M", "C", "C"]
+    assert path.commands[-1][-2:] == pytest.approx((-10, 0))
+
+def test_length():
+    def draw(ctx):
+        ctx.move_to(0, 0)
+        ctx.line_to(10, 0)
+        ctx.arc(10, 5, 5, -math.pi / 2, math.pi / 2)
+    path, = record(draw).paths
+    assert path.length() == pytest.approx(10 + 5 * math.pi)
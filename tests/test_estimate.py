@@ -0,0 +1,52 @@
+import math
+
+import pytest
+
+from boxes import drawing
+from boxes.estimate import Machine
+
+def test_long_line_trapezoid():
+    m = Machine(acceleration=1000)
+    v, a, length = 100.0, 1000.0, 100.0
+    # accelerate, cruise, decelerate
+    expected = 2 * v / a + (length - v * v / a) / v
+    assert m.contourTime([(0, 0), (length, 0)], v) == pytest.approx(expected)
+    assert m.moveTime(length, v) == pytest.approx(expected)
+
+def test_short_line_triangle():
+    m = Machine(acceleration=1000)
+    # never reaches the speed
+    assert m.contourTime([(0, 0), (4, 0)], 100.0) == pytest.approx(
+        2 * math.sqrt(4 / 1000))
+
+def test_straight_points_dont_slow_down():
+    m = Machine(acceleration=1000)
+    points = [(float(x), 0.0) for x in range(0, 101, 10)]
+    assert m.contourTime(points, 100.0) == pytest.approx(
+        m.contourTime([(0, 0), (100, 0)], 100.0))
+
+def test_corner_slows_down():
+    m = Machine(acceleration=1000)
+    corner = m.contourTime([(0, 0), (50, 0), (50, 50)], 100.0)
+    assert corner > m.contourTime([(0, 0), (100, 0)], 100.0)
+
+def test_estimate_line():
+    surface = drawing.Surface()
+    ctx = drawing.Context(surface)
+    ctx.move_to(0, 0)
+    ctx.line_to(100, 0)
+    ctx.stroke()
+    m = Machine(feed=6000, rapid=6000, acceleration=1000, pierce=0.5)
+    result = m.estimate([surface])
+    assert result["cutlength"] == pytest.approx(100)
+    assert result["pierces"] == 1
+    assert result["travel"] == pytest.approx(100) # back to the origin
+    assert result["time"] == pytest.approx(2 * 1.1 + 0.5)
+
+def test_invalid_settings():
+    with pytest.raises(ValueError):
+        Machine(feed=0)
+    with pytest.raises(ValueError):
+        Machine(feed="fast")
+    with pytest.raises(ValueError):
+        Machine(speed=10)
@@ -0,0 +1,75 @@
+import io
+import re
+import xml.etree.ElementTree as ET
+
+import pytest
+
+from boxes import drawing
+from boxes import formats
+
+METADATA = {"name" : "Test", "description" : "Rectangle", "cli" : "boxes Test",
+            "url" : None}
+
+def rectangle():
+    surface = drawing.Surface()
+    ctx = drawing.Context(surface)
+    ctx.rectangle(0, 0, 100, 50)
+    ctx.stroke()
+    return surface
+
+def test_svg():
+    out = io.BytesIO()
+    formats.SVGWriter(out).write(rectangle(), METADATA)
+    root = ET.fromstring(out.getvalue())
+    # 10mm margin, rounded up to full cm
+    assert root.get("width") == "120mm"
+    assert root.get("height") == "70mm"
+    assert root.get("viewBox") == "0 0 120 70"
+    path, = root.iter("{http://www.w3.org/2000/svg}path")
+    xs, ys = [], []
+    x = y = None
+    for cmd, args in re.findall(r"([MLHV])([^MLHV]*)", path.get("d")):
+        args = [float(v) for v in args.split()]
+        if cmd in "ML":
+            x, y = args
+        elif cmd == "H":
+            x, = args
+        else:
+            y, = args
+        xs.append(x)
+        ys.append(y)
+    assert (min(xs), max(xs), min(ys), max(ys)) == (10, 110, 10, 60)
+
+def dxfPairs(data):
+    lines = data.decode("utf-8").split("\n")
+    return [(int(code), value) for code, value in zip(lines[::2], lines[1::2])]
+
+def test_dxf():
+    out = io.BytesIO()
+    formats.DXFWriter(out).write(rectangle(), METADATA)
+    pairs = dxfPairs(out.getvalue())
+    assert pairs[-1] == (0, "EOF")
+    header = dict((pairs[i][1], pairs[i+1:i+3]) for i in range(len(pairs))
+                  if pairs[i][0] == 9)
+    assert header["$ACADVER"][0] == (1, "AC1009")
+    assert "$INSUNITS" not in header
+    assert [float(v) for c, v in header["$EXTMIN"]] == [0, 0]
+    assert [float(v) for c, v in header["$EXTMAX"]] == [100, 50]
+    entities = [v for c, v in pairs if c == 0]
+    assert entities.count("POLYLINE") == 1
+    assert entities.count("VERTEX") == 4
+    xs = [float(v) for c, v in pairs if c == 10]
+    ys = [float(v) for c, v in pairs if c == 20]
+    assert min(xs) == pytest.approx(0) and max(xs) == pytest.approx(100)
+    assert min(ys) == pytest.approx(0) and max(ys) == pytest.approx(50)
+
+def test_svg_metadata_comment():
+    metadata = dict(METADATA, name="Tray & Lid <2>",
+                    cli="boxes Tray ---x=10 --y=5 -")
+    out = io.BytesIO()
+    formats.SVGWriter(out).write(rectangle(), metadata)
+    data = out.getvalue().decode("utf-8")
+    ET.fromstring(data) # still well formed
+    comment = data[data.index("<!--") + 4:data.index("-->")]
+    assert "Tray & Lid <2>" in comment
+    assert "&amp;" not in comment and "--" not in comment
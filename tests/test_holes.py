@@ -0,0 +1,22 @@
+import pytest
+
+import boxes
+from boxes.generators.closedbox import ClosedBox
+
+@pytest.fixture
+def box():
+    box = ClosedBox()
+    box.parseArgs([])
+    box.open()
+    return box
+
+def skipCircle(x, y, r, b, posx, posy):
+    return boxes.dist(posx - x / 2, posy - y / 2) > x / 2 - r
+
+@pytest.mark.skipif(boxes.numpy is None, reason="needs NumPy")
+@pytest.mark.parametrize("skip", [None, skipCircle])
+def test_hex_positions_vectorized(box, monkeypatch, skip):
+    vectorized = box.hexHolesPositions(120, 80, 3, 1, skip)
+    monkeypatch.setattr(boxes, "numpy", None)
+    assert box.hexHolesPositions(120, 80, 3, 1, skip) == vectorized
+    assert len(vectorized) > 50
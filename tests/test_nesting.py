@@ -0,0 +1,42 @@
+import itertools
+
+import pytest
+
+from boxes import drawing
+from boxes import nesting
+
+def parts(sizes):
+    surface = drawing.Surface()
+    ctx = drawing.Context(surface)
+    x = 0
+    for w, h in sizes:
+        surface.beginPart()
+        ctx.rectangle(x, 0, w, h)
+        ctx.stroke()
+        surface.endPart()
+        x += w + 10
+    return surface
+
+def test_nest_within_sheets_without_overlap():
+    sizes = [(60, 30), (40, 40), (90, 20), (20, 80), (50, 50), (30, 30),
+             (70, 10), (45, 25)] * 2
+    spacing = 2.0
+    sheets = nesting.nest(parts(sizes), 100, 100, spacing)
+    assert sum(len(s.parts) for s in sheets) == len(sizes)
+    for sheet in sheets:
+        extends = [sheet.partExtend(p) for p in sheet.parts]
+        for e in extends:
+            assert e.minx > -1E-6 and e.maxx < 100 + 1E-6
+            assert e.miny > -1E-6 and e.maxy < 100 + 1E-6
+        for e1, e2 in itertools.combinations(extends, 2):
+            assert (e1.maxx + spacing <= e2.minx + 1E-6 or
+                    e2.maxx + spacing <= e1.minx + 1E-6 or
+                    e1.maxy + spacing <= e2.miny + 1E-6 or
+                    e2.maxy + spacing <= e1.miny + 1E-6)
+
+def test_nest_rotates_to_fit():
+    sheets = nesting.nest(parts([(20, 90)]), 100, 50)
+    e = sheets[0].extend
+    assert (e.width, e.height) == pytest.approx((90, 20))
+    with pytest.raises(ValueError):
+        nesting.nest(parts([(20, 90)]), 100, 50, rotate=False)
@@ -0,0 +1,112 @@
+import importlib.machinery
+import importlib.util
+import os
+import re
+
+import pytest
+
+from boxes.generators.closedbox import ClosedBox
+
+def loadServer():
+    path = os.path.join(os.path.dirname(__file__), "..", "scripts", "boxesserver")
+    loader = importlib.machinery.SourceFileLoader("boxesserver", path)
+    spec = importlib.util.spec_from_loader("boxesserver", loader)
+    module = importlib.util.module_from_spec(spec)
+    loader.exec_module(module)
+    return module
+
+boxesserver = loadServer()
+
+def parsed(*args):
+    box = ClosedBox()
+    box.parseArgs(list(args))
+    return box
+
+def test_cache_key_normalized():
+    cache = boxesserver.RenderCache()
+    key = cache.key("ClosedBox", parsed())
+    assert cache.key("ClosedBox", parsed("--thickness=3.0")) == key
+    assert cache.key("ClosedBox", parsed("--thickness=3")) == key
+    assert cache.key("ClosedBox", parsed("--output=other.svg")) == key
+    assert cache.key("ClosedBox", parsed("--thickness=4")) != key
+    assert cache.key("ClosedBox", parsed("--format=dxf")) != key
+    assert cache.key("OtherBox", parsed()) != key
+
+def request(server, path, **environ):
+    env = {"PATH_INFO" : path, "QUERY_STRING" : "", "REQUEST_METHOD" : "GET",
+           "wsgi.url_scheme" : "http", "HTTP_HOST" : "localhost"}
+    env.update(environ)
+    response = {}
+    def start_response(status, headers):
+        response["status"] = status
+        response["headers"] = dict(headers)
+    body = b"".join(server.serve(env, start_response))
+    return response["status"], response["headers"], body
+
+@pytest.fixture
+def server(tmp_path):
+    (tmp_path / "js").mkdir()
+    (tmp_path / "js" / "app.0123abcd.js").write_text("var a;")
+    (tmp_path / "self.css").write_text("body {}")
+    server = boxesserver.BServer()
+    server.static = boxesserver.StaticFiles(str(tmp_path))
+    return server
+
+def test_static_hashed_file_is_immutable(server):
+    status, headers, body = request(server, "/static/js/app.0123abcd.js")
+    assert status == "200 OK"
+    assert body == b"var a;"
+    assert "immutable" in headers["Cache-Control"]
+    status, headers, body = request(server, "/static/self.css")
+    assert status == "200 OK"
+    assert "immutable" not in headers["Cache-Control"]
+
+def test_static_rejects_parent_directory(server):
+    status, headers, body = request(server, "/static/js/../self.css")
+    assert status == "404 Not Found"
+    status, headers, body = request(server, "/static/../boxesserver")
+    assert status == "404 Not Found"
+
+def test_etag_matches():
+    etag = '"abc-gzip"'
+    assert boxesserver.etagMatches('"abc-gzip"', etag)
+    assert boxesserver.etagMatches('"x", W/"abc-gzip"', etag)
+    assert boxesserver.etagMatches(' * ', etag)
+    assert not boxesserver.etagMatches('"abc"', etag)
+    assert not boxesserver.etagMatches('"abc-gzip-br"', etag)
+    assert not boxesserver.etagMatches('', etag)
+
+def test_render_not_modified(server):
+    status, headers, body = request(server, "/ClosedBox",
+                                    QUERY_STRING="render=1&x=50")
+    assert status == "200 OK"
+    status, headers304, body = request(server, "/ClosedBox",
+                                       QUERY_STRING="render=1&x=50",
+                                       HTTP_IF_NONE_MATCH=headers["ETag"])
+    assert status == "304 Not Modified"
+    assert body == b""
+    for name in ("ETag", "Last-Modified", "Cache-Control", "Vary"):
+        assert headers304[name] == headers[name]
+    status, headers, body = request(server, "/ClosedBox",
+                                    QUERY_STRING="render=1&x=50",
+                                    HTTP_IF_NONE_MATCH='"%s"' % headers["ETag"][1:-2])
+    assert status == "200 OK"
+
+def test_metrics_kinds(server):
+    request(server, "/static/self.css")
+    request(server, "/ClosedBox", QUERY_STRING="dryrun=1")
+    request(server, "/ClosedBox", QUERY_STRING="estimate=1")
+    status, headers, body = request(server, "/metrics")
+    kinds = set(re.findall(r'kind="(\w+)"', body.decode()))
+    assert {"static", "dryrun", "estimate"} <= kinds
+    assert kinds <= set(boxesserver.Metrics.kinds)
+
+def test_machine_settings_only_for_machine_formats(server):
+    status, headers, body = request(server, "/ClosedBox")
+    page = body.decode("utf-8")
+    start = page.index('<div class="formatgroup" data-formats="gcode plt">')
+    end = page.index("</div>", start)
+    default = page.index("Default Settings")
+    assert default < start
+    for name in ("feed", "power", "passes"):
+        assert start < page.index('name="%s"' % name) < end
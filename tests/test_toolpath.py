@@ -0,0 +1,39 @@
+from boxes import drawing
+from boxes import toolpath
+
+def square(ctx, x, y, size):
+    ctx.rectangle(x, y, size, size)
+    ctx.stroke()
+
+def test_holes_before_outlines():
+    surface = drawing.Surface()
+    ctx = drawing.Context(surface)
+    square(ctx, 0, 0, 100) # outline first
+    square(ctx, 10, 10, 10)
+    square(ctx, 70, 70, 10)
+    (color, contours), = toolpath.toolpaths(surface)
+    assert len(contours) == 3
+    assert contours[-1].extend.width == 100
+    assert all(c.closed for c in contours)
+
+def test_nested_outlines():
+    contours = [toolpath.Contour([(x, y), (x+s, y), (x+s, y+s), (x, y+s), (x, y)],
+                                 (0.0, 0.0, 0.0))
+                for x, y, s in ((0, 0, 100), (200, 0, 50), (10, 10, 50),
+                                (20, 20, 10))]
+    outer, other, middle, inner = contours
+    ordered = toolpath.order(list(contours))
+    assert ordered.index(inner) < ordered.index(middle) < ordered.index(outer)
+    assert inner.parent is middle and middle.parent is outer
+
+def test_pass_points_closed():
+    points = [(0, 0), (10, 0), (10, 10), (0, 0)]
+    c = toolpath.Contour(list(points), (0.0, 0.0, 0.0))
+    assert toolpath.passPoints(c) == points
+    assert toolpath.passPoints(c, 2) == points + points[1:]
+
+def test_pass_points_open():
+    a, b, c = (0, 0), (10, 0), (10, 10)
+    contour = toolpath.Contour([a, b, c], (0.0, 0.0, 0.0))
+    assert toolpath.passPoints(contour, 2) == [a, b, c, b, a]
+    assert toolpath.passPoints(contour, 3) == [a, b, c, b, a, b, c]